@@ -27,7 +27,7 @@ setup(
     python_requires='>=3.8',
     entry_points='''
         [console_scripts]
-        vival=tester.__main__:main
+        vival=tester.__main__:cli
     ''',
     author="Viktor Scherbakov",
     keyword="tester, olympiad, competitive programming, contest",
@@ -1,38 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, redirect_stdout
 from enum import Enum
 from tempfile import TemporaryDirectory
-
-from tester.testmanip import TestsParser, ParseFormat
-from tester.compiler import Compiler
-from tester.lang import Lang, detect_lang
+from typing import List, Optional, Tuple, TextIO
+
+from tester.session import Session, Mode
+from tester.stress import stress, prepare_executable, write_mismatch
+from tester.remote import WorkerServer, DEFAULT_PORT
+from tester.features import Tag, Feature
+from tester.comparators import COMPARISON_MODS
+from tester.lang import Lang
+from tester.watch import Watcher
+from tester.profiling import Profiler
+from tester.report import MultiReporter, NdjsonReporter, JUnitReporter
 
 from tqdm import tqdm
 import click
+import cProfile
 import os
-import shutil
+import sys
 
 import pkg_resources
 
 __version__ = pkg_resources.require('vival')[0].version
 
 
-class Mode(Enum):
-    TEST = 'test'
-    FILL = 'fill'
-
 class Encoding(Enum):
     ASCII = 'ascii'
     UTF = 'utf-8'
 
+
+def open_reports(ndjson_filename: Optional[str], junit_filename: Optional[str],
+                 stdout: TextIO) -> Tuple[MultiReporter, List[TextIO]]:
+    """Creates reporters writing to given files ('-' for stdout). Returns reporter and files to close"""
+    reporters = []
+    report_files = []
+    for report_filename, reporter_class in ((ndjson_filename, NdjsonReporter), (junit_filename, JUnitReporter)):
+        if report_filename is None:
+            continue
+
+        if report_filename == '-':
+            report_file = stdout
+        else:
+            report_file = open(report_filename, 'w')
+            report_files.append(report_file)
+
+        reporters.append(reporter_class(report_file))
+
+    return MultiReporter(reporters), report_files
+
+
 @click.command()
 @click.version_option(__version__, prog_name='VIVAL')
 @click.option('-ue', '--use-encoding',
               default=Encoding.ASCII.value,
               type=click.Choice([enc.value for enc in Encoding], case_sensitive=False),
               help="Text file encoding to use. Select 'utf-8' on Windows.")
-@click.option('-t', '--tests', 'tests_file',
+@click.option('-t', '--tests', 'tests_filename',
               default='tests.txt',
-              type=click.File(),
-              help='Path to file with tests.')
+              type=click.Path(exists=True, dir_okay=False, allow_dash=True),
+              help='Path to file with tests (may be compressed with gzip, xz or bzip2).')
 @click.option('-nt', '--ntests',
               default=5, show_default=True,
               type=click.INT,
@@ -40,7 +67,8 @@ class Encoding(Enum):
 @click.option('-o', '--output', 'output_filename',
               default=None,
               type=click.Path(writable=True),
-              help='File to store all the extracted (and maybe filled) tests.')
+              help='File to store all the extracted (and maybe filled) tests. '
+                   'Compressed if ends with .gz, .xz or .bz2.')
 @click.option('-l', '--lang',
               default=Lang.CPP.value, show_default=True,
               type=click.Choice([lang.value for lang in Lang], case_sensitive=False),
@@ -50,6 +78,11 @@ class Encoding(Enum):
               type=click.Choice([mode.value for mode in Mode], case_sensitive=False),
               help='In fill mode will fill in outputs of unfilled tests. '
                    'In test mode will run executable on given tests.')
+@click.option('--binary',
+              is_flag=True,
+              default=False,
+              help='Pass INPUT and OUTPUT to and from the program as raw bytes without decoding them. '
+                   'Use for programs with non-text or non-ASCII output.')
 @click.option('--old-format',
               is_flag=True,
               help='Flag for backward compatibility.')
@@ -61,105 +94,304 @@ class Encoding(Enum):
 @click.option('-vg', '--valgrind',
               default=False,
               is_flag=True,
-              help='Flag for valgrind memory checks.')
+              help='Flag for valgrind memory checks. Checks run separately from tests and fail tests with memory errors.')
+@click.option('--valgrind-sample',
+              default=-1, show_default=False,
+              type=click.INT,
+              help='Run valgrind only on specified number of randomly selected tests.')
+@click.option('--valgrind-on-fail-only',
+              default=False,
+              is_flag=True,
+              help='Run valgrind only on failed tests.')
+@click.option('--valgrind-jobs',
+              default=os.cpu_count() or 1, show_default=True,
+              type=click.INT,
+              help='Number of valgrind checks running in parallel.')
+@click.option('--timeout-factor',
+              default=None,
+              type=click.FLOAT,
+              help='Limit time of tests with recorded reference time (REFTIME) to specified multiple of it '
+                   'instead of TIMEOUT.')
+@click.option('--timeout-floor',
+              default=0.1, show_default=True,
+              type=click.FLOAT,
+              help='Lower bound for time limits set with --timeout-factor.')
+@click.option('--timeout-calibration',
+              default=1.0, show_default=True,
+              type=click.FLOAT,
+              help='Relative slowness of this machine compared to the one tests were filled on.')
+@click.option('-j', '--jobs',
+              default=1, show_default=True,
+              type=click.INT,
+              help='Number of tests running in parallel. Use with --isolate if tests work with files.')
+@click.option('--isolate',
+              default=False,
+              is_flag=True,
+              help='Run each test in its own temporary directory (in memory if possible) with copies of FIXTURES.')
+@click.option('--dedup',
+              default=False,
+              is_flag=True,
+              help='Run program only once on tests with the same INPUT, CMD, STARTUP and CLEANUP.')
+@click.option('--worker', 'workers',
+              multiple=True,
+              help='Address (host:port) of a machine running vival worker. Tests are run on given workers '
+                   'instead of this machine. May be repeated.')
+@click.option('-w', '--watch',
+              default=False,
+              is_flag=True,
+              help='Rerun tests whenever source code or tests file changes.')
+@click.option('--ndjson', 'ndjson_filename',
+              default=None,
+              type=click.Path(writable=True, allow_dash=True),
+              help="File to stream results of tests to as JSON lines ('-' for stdout).")
+@click.option('--junit', 'junit_filename',
+              default=None,
+              type=click.Path(writable=True, allow_dash=True),
+              help="File to stream results of tests to in JUnit XML format ('-' for stdout).")
+@click.option('--profile',
+              default=False,
+              is_flag=True,
+              help='Print time spent in each phase of testing.')
+@click.option('--trace', 'trace_filename',
+              default=None,
+              type=click.Path(writable=True, resolve_path=True),
+              help='File to store timings of testing phases in Chrome trace format.')
+@click.option('--cprofile', 'cprofile_filename',
+              default=None,
+              type=click.Path(writable=True, resolve_path=True),
+              help="File to store cProfile statistics of VIVAL's own process (runs of tests are included with -j 1).")
 @click.option('-bf', '--break-fail',
               default=-1, show_default=False,
               type=click.INT,
               help='Stop testing when failed specified number of times.')
-def main(executable_path, tests_file, ntests, output_filename, lang, mode, use_encoding, old_format, valgrind, break_fail, add_quotes):
-    with TemporaryDirectory() as tempdir_name:
-        executable_path = os.path.abspath(executable_path)
+def main(executable_path, tests_filename, ntests, output_filename, lang, mode, use_encoding, binary, old_format, valgrind,
+         valgrind_sample, valgrind_on_fail_only, valgrind_jobs, timeout_factor, timeout_floor, timeout_calibration,
+         jobs, isolate, dedup, workers, watch, ndjson_filename, junit_filename, profile, trace_filename, cprofile_filename,
+         break_fail, add_quotes):
+    """Runs program on tests from tests file (default command)."""
+    report_stdout = sys.stdout
+    # reports streamed to stdout have to stay parseable, so everything else goes to stderr then
+    human_output = redirect_stdout(sys.stderr) if '-' in (ndjson_filename, junit_filename) else nullcontext()
+
+    with human_output:
+        mode = Mode(mode)
+        if watch and mode == Mode.FILL:
+            print('Watch mode is not available in fill mode!')
+            return
+
+        if watch and tests_filename == '-':
+            print('Watch mode is not available for tests from stdin!')
+            return
 
         if output_filename is not None:
             output_filename = os.path.abspath(output_filename)
 
-        mode = Mode(mode)
-        parser = TestsParser(ParseFormat.OLD if old_format else ParseFormat.NEW, expect_filled_tests=(mode == Mode.TEST), encoding=use_encoding, exec_quotes=add_quotes)
-        tests = parser.parse(tests_file)
+        session = Session(executable_path, tests_filename if tests_filename != '-' else None, lang, mode, use_encoding,
+                          binary, old_format, add_quotes, valgrind, valgrind_sample, valgrind_on_fail_only,
+                          valgrind_jobs, timeout_factor, timeout_floor, timeout_calibration, jobs, isolate, dedup,
+                          break_fail, workers)
+
+        def run_suite(reparse: bool, profiler: Profiler) -> None:
+            if reparse:
+                parse_result = session.parse(profiler=profiler)
+                if not parse_result.ok:
+                    print('Parse failed!')
+                    print(parse_result.error_message)
+                    return
+
+                if len(parse_result.warning_messages) > 0:
+                    print('Warnings from parser:')
+                    for warning in parse_result.warning_messages:
+                        print(warning)
+
+            compile_result = session.compile(profiler)
+            if not compile_result.ok:
+                print('Compilation failed!')
+                print(compile_result.error_message)
+                return
 
-        if parser.get_sanitizers() and valgrind:
-            print('Warning: valgrind is enabled, so sanitizers were deleted from flags')
-            parser.delete_sanitizers()
+            reporter, report_files = open_reports(ndjson_filename, junit_filename, report_stdout)
+            mode2desc = {Mode.TEST: 'Testing', Mode.FILL: 'Filling'}
+            try:
+                with tqdm(total=len(session.suitable_tests()), desc=mode2desc[mode], leave=False) as progress:
+                    run_result = session.run(reporter, progress.update, profiler)
+            finally:
+                for report_file in report_files:
+                    report_file.close()
+
+            if not run_result.ok:
+                print(run_result.error_message)
+                return
 
-        if tests is None:
-            print('Parse failed!')
-            print(parser.parse_details['error_message'])
-            return
+            for warning in run_result.warning_messages:
+                print('Warning: ' + warning)
 
-        if len(parser.parse_details['warning_messages']) > 0:
-            print('Warnings from parser:')
-            for warning in parser.parse_details['warning_messages']:
-                print(warning)
+            if run_result.unchecked > 0:
+                print('Warning: valgrind did not complete on ' + str(run_result.unchecked) + ' tests')
 
-        detected_language = detect_lang(executable_path)
-        if detected_language is None:
-            detected_language = lang
+            with profiler.span('report'):
+                print(session.report(run_result, ntests))
 
-        if detected_language == Lang.CPP or detected_language == Lang.C:
-            compiler = Compiler(lang=detected_language, temp_dir=tempdir_name, flags=parser.get_flags())
+            if output_filename is not None:
+                session.write_tests(output_filename, profiler)
 
-            if parser.has_main():
-                executable_path = compiler.compile(executable_path, parser.get_main())
-            else:
-                executable_path = compiler.compile(executable_path)
+        def profiled_run_suite(reparse: bool) -> None:
+            profiler = Profiler(enabled=profile or trace_filename is not None)
+            own_profile = cProfile.Profile() if cprofile_filename is not None else None
 
-            if executable_path is None:
-                print('Compilation failed!')
-                print(compiler.compile_details['error_message'])
+            if own_profile is not None:
+                own_profile.enable()
+
+            run_suite(reparse, profiler)
+
+            if own_profile is not None:
+                own_profile.disable()
+                own_profile.dump_stats(cprofile_filename)
+
+            if profile:
+                print('\n' + profiler.summary())
+
+            if trace_filename is not None:
+                profiler.write_chrome_trace(trace_filename)
+
+        with session:
+            # started before the first run, so that files saved during it are noticed
+            watcher = Watcher([session.source_path, session.tests_path]) if watch else None
+            try:
+                profiled_run_suite(reparse=True)
+
+                while watcher is not None:
+                    print('\nWatching for changes...')
+                    profiled_run_suite(reparse=session.apply_changes(watcher.wait()))
+            except KeyboardInterrupt:
+                if watcher is None:
+                    raise
+            finally:
+                if watcher is not None:
+                    watcher.close()
+
+
+@click.command()
+@click.option('-g', '--gen', 'generator_path',
+              required=True,
+              type=click.Path(exists=True, resolve_path=True),
+              help='Generator of inputs (executable or C/C++ source). Gets seed as its only argument.')
+@click.option('-r', '--ref', 'reference_path',
+              required=True,
+              type=click.Path(exists=True, resolve_path=True),
+              help='Reference solution (executable or C/C++ source).')
+@click.argument('solution_path', type=click.Path(exists=True, resolve_path=True))
+@click.option('-n', '--iterations',
+              default=1000, show_default=True,
+              type=click.INT,
+              help='Number of generated tests.')
+@click.option('--seed', 'first_seed',
+              default=1, show_default=True,
+              type=click.INT,
+              help='Seed of the first generated test, the following ones get consecutive seeds.')
+@click.option('-j', '--jobs',
+              default=os.cpu_count() or 1, show_default=True,
+              type=click.INT,
+              help='Number of tests running in parallel.')
+@click.option('--timeout',
+              default=float(Feature.default_content(Tag.TIMEOUT)), show_default=True,
+              type=click.FLOAT,
+              help='Time limit for every run of generator, reference and solution.')
+@click.option('--output-limit',
+              default=int(Feature.default_content(Tag.OUTLIMIT)), show_default=True,
+              type=click.INT,
+              help='Limit of output in bytes for every run of reference and solution.')
+@click.option('--mod', 'mods',
+              multiple=True,
+              type=click.Choice(['mSHUFFLED'] + list(COMPARISON_MODS)),
+              help='Modifier of expected output defining how it is compared with output of solution.')
+@click.option('--epsilon',
+              default=float(Feature.default_content(Tag.EPSILON)), show_default=True,
+              type=click.FLOAT,
+              help='Allowed error of numbers compared with mFLOAT.')
+@click.option('--flags',
+              default='',
+              help='Flags for compilation of C/C++ sources.')
+@click.option('-o', '--output', 'output_filename',
+              default='stress.txt', show_default=True,
+              type=click.Path(writable=True),
+              help='File to write the first mismatched test to.')
+def stress_command(generator_path, reference_path, solution_path, iterations, first_seed, jobs, timeout, output_limit,
+                   mods, epsilon, flags, output_filename):
+    """Compares solution with reference solution on generated tests."""
+    with TemporaryDirectory() as tempdir_name, ThreadPoolExecutor(max_workers=3) as compile_pool:
+        programs = {'generator': generator_path, 'reference': reference_path, 'solution': solution_path}
+        builds = {name: compile_pool.submit(prepare_executable, path, os.path.join(tempdir_name, name), flags)
+                  for name, path in programs.items()}
+
+        executables = {}
+        for name, build in builds.items():
+            executables[name], error_message = build.result()
+            if executables[name] is None:
+                print('Compilation of ' + name + ' failed!')
+                print(error_message)
                 return
 
-        if parser.get_checker():
-            executable_path = ' '.join([os.path.abspath(parser.get_checker()), executable_path])
+        with tqdm(total=iterations, desc='Stress testing', leave=False) as progress:
+            result = stress(executables['generator'], executables['reference'], executables['solution'], iterations,
+                            first_seed, jobs, timeout, epsilon, mods, output_limit=output_limit,
+                            progress=progress.update)
 
-        if valgrind:
-            valgrind_options = [shutil.which('valgrind'), '-q', '--leak-check=full']
-            executable_path = ' '.join(valgrind_options + [executable_path])
+    if result.error_message is not None:
+        print(result.error_message)
+        return
 
-        passed = 0
-        failed = 0
-        suitable = 0
+    print('Passed tests: ' + str(result.iterations - (result.mismatch is not None)) + '/' + str(result.iterations)
+          + ' ({:.1f} tests/s)'.format(result.iterations / result.elapsed if result.elapsed > 0 else 0))
 
-        timeout = parser.get_timeout()
+    if result.mismatch is not None:
+        print('Mismatch on seed ' + str(result.seed) + ':\n')
+        result.mismatch.print_last_run()
 
-        mode2desc = {Mode.TEST: 'Testing', Mode.FILL: 'Filling'}
-        for test in tqdm(tests, desc=mode2desc[mode], leave=False):
-            run_succeeded = False
-            if (test.filled and mode == Mode.TEST) or (not test.filled and mode == Mode.FILL):
-                run_succeeded = test.run(executable_path, timeout)
-                suitable += 1
+        write_mismatch(result.mismatch, output_filename, timeout, epsilon, flags, output_limit)
+        print('Test was written to ' + output_filename + ', run it with --binary flag.')
 
-            if run_succeeded:
-                passed += 1
-                if mode == Mode.FILL:
-                    test.fill()
-            else:
-                failed += 1
-                if break_fail > 0 and failed >= break_fail:
-                    break
 
-        print('\n' + str(parser) + '\n')
+@click.command()
+@click.option('--host',
+              default='127.0.0.1', show_default=True,
+              help='Address to listen on. Use 0.0.0.0 to accept connections from other machines.')
+@click.option('--port',
+              default=DEFAULT_PORT, show_default=True,
+              type=click.INT,
+              help='Port to listen on.')
+@click.option('-j', '--jobs',
+              default=os.cpu_count() or 1, show_default=True,
+              type=click.INT,
+              help='Number of tests running in parallel.')
+def worker_command(host, port, jobs):
+    """Runs tests sent by vival --worker HOST:PORT.
+    Any received program is executed, so listen only on trusted networks."""
+    with WorkerServer((host, port), jobs) as server:
+        print('Listening on ' + host + ':' + str(server.server_address[1]))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
-        if passed < suitable:
-            print('Failed on these tests:\n')
 
-            printed = 0
-            for test in tests:
-                if printed >= ntests:
-                    break
+class DefaultCommandGroup(click.Group):
+    """Group of commands that runs default_command unless the first argument names another one or asks for help"""
 
-                if test.failed:
-                    test.print_last_run()
-                    printed += 1
+    def __init__(self, *args, default_command: str, **kwargs):
+        super(DefaultCommandGroup, self).__init__(*args, **kwargs)
+        self.default_command = default_command
 
-        if mode == Mode.TEST:
-            print('Passed tests: ' + str(passed) + '/' + str(suitable))
+    def parse_args(self, ctx, args):
+        if len(args) == 0 or (args[0] not in self.commands and args[0] not in ctx.help_option_names):
+            args = [self.default_command] + list(args)
 
-        if mode == Mode.FILL:
-            print('Filled tests: ' + str(passed) + '/' + str(suitable))
+        return super(DefaultCommandGroup, self).parse_args(ctx, args)
 
-        if output_filename is not None:
-            parser.write_tests(tests, output_filename)
 
+cli = DefaultCommandGroup(commands={'test': main, 'stress': stress_command, 'worker': worker_command}, default_command='test',
+                          help="Tests program on tests file (vival [test] ...) or against reference solution "
+                               "(vival stress ...) and runs tests for other machines (vival worker).")
 
 if __name__ == '__main__':
-    main()
+    cli()
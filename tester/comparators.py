@@ -0,0 +1,73 @@
+from typing import Any, AnyStr, List, Optional, Tuple
+
+# comparison modifiers of OUTPUT feature in order of precedence
+COMPARISON_MODS = ('mFLOAT', 'mTOKENS', 'mTRIM')
+
+
+def trim(text: AnyStr) -> AnyStr:
+    """Removes trailing whitespace of every line and trailing empty lines"""
+    newline = b'\n' if isinstance(text, bytes) else '\n'
+    return newline.join(line.rstrip() for line in text.rstrip().split(newline))
+
+
+def to_number(token: AnyStr) -> Optional[float]:
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def prepare(mod: str, expected: AnyStr) -> Any:
+    """Converts expected output to the form used by comparator of mod.
+    Done once per test, so that reruns only process program output.
+    Works the same way for text and raw bytes"""
+    if mod == 'mFLOAT':
+        tokens = expected.split()
+        return tokens, [to_number(token) for token in tokens]
+
+    if mod == 'mTOKENS':
+        return expected.split()
+
+    if mod == 'mTRIM':
+        return trim(expected)
+
+    raise ValueError('Unknown comparison modifier: ' + mod)
+
+
+def compare_numbers(expected: Tuple[List[AnyStr], List[Optional[float]]], output: AnyStr, epsilon: float) -> bool:
+    """Compares tokens, numeric ones may differ by absolute or relative error of epsilon"""
+    expected_tokens, expected_numbers = expected
+    output_tokens = output.split()
+
+    if len(expected_tokens) != len(output_tokens):
+        return False
+
+    if expected_tokens == output_tokens:
+        return True
+
+    for expected_token, expected_number, output_token in zip(expected_tokens, expected_numbers, output_tokens):
+        if expected_token == output_token:
+            continue
+
+        output_number = to_number(output_token)
+        if expected_number is None or output_number is None:
+            return False
+
+        if not abs(expected_number - output_number) <= epsilon * max(1.0, abs(expected_number)):
+            return False
+
+    return True
+
+
+def compare(mod: str, expected: Any, output: AnyStr, epsilon: float) -> bool:
+    """Compares output with expected output prepared for mod"""
+    if mod == 'mFLOAT':
+        return compare_numbers(expected, output, epsilon)
+
+    if mod == 'mTOKENS':
+        return expected == output.split()
+
+    if mod == 'mTRIM':
+        return expected == trim(output)
+
+    raise ValueError('Unknown comparison modifier: ' + mod)
@@ -0,0 +1,49 @@
+import bz2
+import gzip
+import lzma
+import os
+from typing import Callable, Dict, Optional, TextIO
+
+Opener = Callable[..., TextIO]
+
+_magic2opener: Dict[bytes, Opener] = {
+    b'\x1f\x8b': gzip.open,
+    b'\xfd7zXZ\x00': lzma.open,
+    b'BZh': bz2.open,
+}
+
+_ext2opener: Dict[str, Opener] = {
+    '.gz': gzip.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open,
+    '.bz2': bz2.open,
+}
+
+
+def detect_opener(path: os.PathLike, reading: bool = True) -> Optional[Opener]:
+    """Finds opener of compressed file by its magic bytes when reading or by extension otherwise.
+    Returns None for uncompressed files"""
+    if reading:
+        with open(path, 'rb') as file:
+            head = file.read(max(map(len, _magic2opener)))
+
+        for magic, opener in _magic2opener.items():
+            if head.startswith(magic):
+                return opener
+
+        return None
+
+    for ext, opener in _ext2opener.items():
+        if str(path).endswith(ext):
+            return opener
+
+    return None
+
+
+def open_text(path: os.PathLike, mode: str = 'r', encoding: Optional[str] = None, newline: Optional[str] = None) -> TextIO:
+    """Opens text file, transparently (de)compressing .gz, .xz and .bz2 files on the fly"""
+    opener = detect_opener(path, reading='r' in mode)
+    if opener is None:
+        return open(path, mode, encoding=encoding, newline=newline)
+
+    return opener(path, mode + 't', encoding=encoding, newline=newline)
@@ -1,7 +1,7 @@
 import os
 from os.path import join
 from enum import Enum
-from typing import Optional, Dict, List, Iterable
+from typing import Optional, Dict, List, Iterable, Union
 
 from pydantic import BaseModel, parse_file_as
 
@@ -22,6 +22,10 @@ class Tag(Enum):
     CMD = 'CMD'
     OUTPUT = 'OUTPUT'
     CHECKER = 'CHECKER'
+    EPSILON = 'EPSILON'
+    FIXTURES = 'FIXTURES'
+    REFTIME = 'REFTIME'
+    OUTLIMIT = 'OUTLIMIT'
 
 
 class FeatureType(Enum):
@@ -43,7 +47,7 @@ class Feature:
 
     tag_configs: Dict[Tag, TagConfig] = {config.tag: config for config in parse_file_as(List[TagConfig], join(config_path, 'tags.json'))}
 
-    all_mods = {'mSHUFFLED', 'mENDNL', 'mENDSPACE', 'mENDNONE'}
+    all_mods = {'mSHUFFLED', 'mENDNL', 'mENDSPACE', 'mENDNONE', 'mTOKENS', 'mTRIM', 'mFLOAT'}
 
     def __init__(self, tag: Optional[Tag], contents: Optional[Iterable[str]] = ()):
         if tag is None:
@@ -53,6 +57,7 @@ class Feature:
         self.contents = list(contents)
         self.mods = set()
         self.join_symbol = self.tag_configs[self.tag].join_symbol
+        self.binary = False  # set by to_bytes, so that empty contents are bytes as well
 
         if self.is_empty() and self.default_content(self.tag) is not None:
             self.contents = [self.default_content(self.tag)]
@@ -93,9 +98,19 @@ class Feature:
         return self.tag_configs[self.tag].type == FeatureType.FILE
 
     def is_empty(self) -> bool:
-        return self.merged_contents() == ''
+        return len(self.merged_contents()) == 0
 
-    def merged_contents(self) -> str:
+    def is_binary(self) -> bool:
+        return self.binary or (len(self.contents) > 0 and isinstance(self.contents[0], bytes))
+
+    def to_bytes(self) -> None:
+        """Stores contents as raw bytes. Text is expected to be read with latin-1, which maps it back losslessly"""
+        self.contents = [text if isinstance(text, bytes) else text.encode('latin-1') for text in self.contents]
+        self.binary = True
+
+    def merged_contents(self) -> Union[str, bytes]:
+        if self.is_binary():
+            return self.join_symbol.encode('latin-1').join(self.contents)
         return self.join_symbol.join(self.contents)
 
     def __str__(self):
@@ -110,6 +125,8 @@ class Feature:
             str_repr += '/{' + '}/\n\n'
         else:
             for text in self.contents:
+                if isinstance(text, bytes):
+                    text = text.decode('latin-1')
                 str_repr += '/{' + text + '}/' + self.join_symbol
             if self.join_symbol != '\n':
                 str_repr += '\n\n'
@@ -125,6 +142,13 @@ class Feature:
         return self.tag_configs[self.tag].id < self.tag_configs[other.tag].id
 
 
+def display_text(contents: Union[str, bytes, None]) -> Optional[str]:
+    """Decodes raw bytes for printing, undecodable sequences are replaced"""
+    if isinstance(contents, bytes):
+        return contents.decode('utf-8', errors='replace')
+    return contents
+
+
 def construct_test_features() -> List[Feature]:
     return [
         Feature(tag)
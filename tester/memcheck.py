@@ -0,0 +1,38 @@
+import shlex
+import shutil
+import xml.etree.ElementTree as ElementTree
+from typing import List, Optional
+
+# programs run under valgrind are considerably slower, so memchecks get extended time limits
+VALGRIND_SLOWDOWN: float = 20.0
+
+
+def find_valgrind() -> Optional[str]:
+    return shutil.which('valgrind')
+
+
+def valgrind_command(valgrind_path: str, xml_path: str) -> str:
+    """Returns command prefix that runs program under valgrind storing XML report in xml_path"""
+    return ' '.join([
+        shlex.quote(valgrind_path), '-q', '--leak-check=full',
+        '--xml=yes', '--xml-file=' + shlex.quote(xml_path)
+    ])
+
+
+def read_report(xml_path: str) -> Optional[List[str]]:
+    """Extracts descriptions of errors from valgrind XML report.
+    Returns None if report is missing or malformed"""
+    try:
+        root = ElementTree.parse(xml_path).getroot()
+    except (OSError, ElementTree.ParseError):
+        return None
+
+    errors = []
+    for error in root.iter('error'):
+        kind = error.findtext('kind', default='Error')
+        what = error.findtext('what')
+        if what is None:
+            what = error.findtext('xwhat/text', default='')
+        errors.append(kind + ': ' + what)
+
+    return errors
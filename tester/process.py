@@ -0,0 +1,213 @@
+from subprocess import PIPE, STDOUT, DEVNULL
+import subprocess
+
+import io
+import os
+import signal
+import threading
+import time
+from typing import AnyStr, List, NamedTuple, Optional, Tuple, Union
+
+# size of chunks in which output is read when it is limited
+READ_CHUNK_SIZE = 1 << 16
+
+# output over the limit is cut to this many bytes at the beginning and at the end
+OUTPUT_EXCERPT_SIZE = 1 << 12
+
+
+class ProcessResult(NamedTuple):
+    output: Union[str, bytes, None]
+    returncode: Optional[int]
+    timed_out: bool
+    elapsed: float
+    output_limit_exceeded: bool = False
+
+
+def cut_middle(contents: AnyStr, size: int) -> AnyStr:
+    """Keeps only size first and size last characters of contents"""
+    if len(contents) <= 2 * size:
+        return contents
+
+    marker = '\n...\n' if isinstance(contents, str) else b'\n...\n'
+    return contents[:size] + marker + contents[-size:]
+
+
+class BackgroundGroups:
+    """Process groups of shell commands that may have left background processes (e.g. started in STARTUP)"""
+
+    def __init__(self):
+        self._groups: List[subprocess.Popen] = []
+        self._lock = threading.Lock()
+
+    def add(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            self._groups.append(process)
+
+    def sweep(self) -> None:
+        """Kills everything left running by added groups"""
+        with self._lock:
+            groups = list(self._groups)
+            self._groups.clear()
+
+        for process in groups:
+            kill_stragglers(process)
+
+
+# used unless the caller tracks its groups separately
+_background_groups = BackgroundGroups()
+
+
+def _start(args: str, **kwargs) -> subprocess.Popen:
+    """Starts shell command as a leader of new process group"""
+    if os.name == 'posix':
+        return subprocess.Popen(args, shell=True, start_new_session=True, **kwargs)
+
+    return subprocess.Popen(args, shell=True, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP, **kwargs)
+
+
+def kill_group(process: subprocess.Popen) -> None:
+    """Kills process together with all of its descendants"""
+    if os.name == 'posix':
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass  # the whole group has already exited
+    else:
+        subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], stdout=DEVNULL, stderr=DEVNULL)
+        process.kill()
+
+
+def kill_stragglers(process: subprocess.Popen) -> None:
+    """Kills processes left in the group of exited process. Only POSIX groups outlive their leader,
+    elsewhere the tree of exited process can not be found, so nothing is done (and no taskkill is started)"""
+    if os.name == 'posix':
+        kill_group(process)
+
+
+def _communicate_limited(process: subprocess.Popen, input: Optional[bytes], timeout: Optional[float],
+                         output_limit: int) -> Tuple[bytes, bool, bool]:
+    """Reads output in chunks, killing process group as soon as output_limit is exceeded.
+    Returns output (cut if the limit was exceeded), whether time limit and output limit were exceeded"""
+    output = bytearray()
+    output_limit_exceeded = False
+
+    def read() -> None:
+        nonlocal output_limit_exceeded
+
+        for chunk in iter(lambda: process.stdout.read1(READ_CHUNK_SIZE), b''):
+            output.extend(chunk)
+            if len(output) > output_limit:
+                output_limit_exceeded = True
+                kill_group(process)
+                return
+
+    def write() -> None:
+        try:
+            process.stdin.write(input)
+            process.stdin.close()
+        except OSError:
+            pass  # the program does not read its whole input
+
+    # writer is not waited for, it stops with broken pipe once the group is killed
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    if input is not None:
+        threading.Thread(target=write, daemon=True).start()
+
+    deadline = time.perf_counter() + timeout if timeout is not None else None
+
+    def remaining() -> Optional[float]:
+        return max(0.0, deadline - time.perf_counter()) if deadline is not None else None
+
+    reader.join(remaining())
+    timed_out = reader.is_alive()
+    if not timed_out:
+        try:
+            process.wait(remaining())
+        except subprocess.TimeoutExpired:
+            timed_out = True
+
+    if timed_out:
+        kill_group(process)
+    reader.join()
+    process.wait()
+    process.stdout.close()
+
+    if output_limit_exceeded:
+        return cut_middle(bytes(output), OUTPUT_EXCERPT_SIZE), False, True
+    return bytes(output), timed_out, False
+
+
+def run_process(args: str, input: Union[str, bytes, None] = None, timeout: Optional[float] = None,
+                encoding: Optional[str] = None, stdout: Optional[int] = PIPE, stderr: Optional[int] = STDOUT,
+                keep_background: bool = False, cwd: Optional[str] = None,
+                background_groups: Optional[BackgroundGroups] = None,
+                output_limit: Optional[int] = None) -> ProcessResult:
+    """Runs shell command in its own process group, killing the whole group on timeout.
+    Processes left in the group after the command exits are killed as well, unless keep_background is set,
+    in which case the group is added to background_groups (swept by sweep_background_groups by default).
+    Output (if piped) is limited to output_limit bytes, group is killed as soon as the program goes over it"""
+    if output_limit is not None and stdout == PIPE:
+        return _run_limited(args, input, timeout, encoding, stderr, keep_background, cwd, background_groups,
+                            output_limit)
+
+    process = _start(args, stdin=PIPE if input is not None else None, stdout=stdout, stderr=stderr, encoding=encoding,
+                     cwd=cwd)
+
+    started = time.perf_counter()
+    try:
+        output, _ = process.communicate(input, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_group(process)
+        process.communicate()
+        return ProcessResult(None, None, True, time.perf_counter() - started)
+    except BaseException:
+        kill_group(process)
+        process.wait()
+        raise
+
+    if keep_background:
+        (_background_groups if background_groups is None else background_groups).add(process)
+    else:
+        kill_stragglers(process)
+
+    return ProcessResult(output, process.returncode, False, time.perf_counter() - started)
+
+
+def _run_limited(args: str, input: Union[str, bytes, None], timeout: Optional[float], encoding: Optional[str],
+                 stderr: Optional[int], keep_background: bool, cwd: Optional[str],
+                 background_groups: Optional[BackgroundGroups], output_limit: int) -> ProcessResult:
+    """run_process reading output as bytes and decoding it afterwards"""
+    if isinstance(input, str):
+        input = input.encode(encoding if encoding is not None else 'latin-1')
+
+    process = _start(args, stdin=PIPE if input is not None else None, stdout=PIPE, stderr=stderr, cwd=cwd)
+
+    started = time.perf_counter()
+    try:
+        output, timed_out, output_limit_exceeded = _communicate_limited(process, input, timeout, output_limit)
+    except BaseException:
+        kill_group(process)
+        process.wait()
+        raise
+    elapsed = time.perf_counter() - started
+
+    if timed_out:
+        return ProcessResult(None, None, True, elapsed)
+
+    if keep_background and not output_limit_exceeded:
+        (_background_groups if background_groups is None else background_groups).add(process)
+    else:
+        kill_stragglers(process)
+
+    if encoding is not None:
+        # decoded the same way as by text mode pipes, text is cut only when the limit is exceeded
+        errors = 'replace' if output_limit_exceeded else 'strict'
+        output = io.TextIOWrapper(io.BytesIO(output), encoding=encoding, errors=errors).read()
+
+    return ProcessResult(output, process.returncode, False, elapsed, output_limit_exceeded)
+
+
+def sweep_background_groups() -> None:
+    """Kills everything left running by commands started with keep_background without own background_groups"""
+    _background_groups.sweep()
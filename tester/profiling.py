@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple
+
+
+class Span(NamedTuple):
+    name: str
+    start: float
+    duration: float
+    thread_id: int
+    args: Dict[str, Any]
+
+
+class Profiler:
+    """Collects timed spans of vival's work phases"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[None]:
+        """Times the enclosed block as a span called name. Keyword arguments are stored with the span"""
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            span = Span(name, start, time.perf_counter() - start, threading.get_ident(), args)
+            with self._lock:
+                self.spans.append(span)
+
+    def summary(self) -> str:
+        """Table with total time spent in each kind of span"""
+        stats: Dict[str, List[float]] = {}
+        for span in self.spans:
+            stats.setdefault(span.name, []).append(span.duration)
+
+        lines = ['{:<16}{:>10}{:>12}{:>12}{:>12}'.format('Phase', 'Count', 'Total, s', 'Mean, s', 'Max, s')]
+        for name, durations in sorted(stats.items(), key=lambda item: -sum(item[1])):
+            lines.append('{:<16}{:>10}{:>12.4f}{:>12.4f}{:>12.4f}'.format(
+                name, len(durations), sum(durations), sum(durations) / len(durations), max(durations)
+            ))
+
+        return '\n'.join(lines)
+
+    def write_chrome_trace(self, trace_filename: os.PathLike) -> None:
+        """Writes spans in Chrome trace event format (viewable in chrome://tracing or Perfetto)"""
+        origin = min((span.start for span in self.spans), default=0.0)
+        events = [
+            {
+                'name': span.name,
+                'ph': 'X',
+                'ts': (span.start - origin) * 1e6,
+                'dur': span.duration * 1e6,
+                'pid': os.getpid(),
+                'tid': span.thread_id,
+                'args': span.args,
+            }
+            for span in self.spans
+        ]
+
+        with open(trace_filename, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+
+
+DISABLED_PROFILER = Profiler(enabled=False)
@@ -0,0 +1,303 @@
+from queue import Queue
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import base64
+import hashlib
+import json
+import os
+import re
+import socket
+import socketserver
+import threading
+
+from tester.features import Tag, Feature
+from tester.process import BackgroundGroups
+from tester.profiling import Profiler, DISABLED_PROFILER
+from tester.testmanip import Test
+
+DEFAULT_PORT = 7878
+
+UNKNOWN_EXECUTABLE = 'Unknown executable'
+
+# time on top of test's time limits after which unresponsive worker is considered lost
+REQUEST_MARGIN = 30.0
+
+# features that define program's execution (see Test.execution_key), only they are sent to workers
+EXECUTION_TAGS = (Tag.INPUT, Tag.CMD, Tag.STARTUP, Tag.CLEANUP)
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Splits host:port, port is optional"""
+    host, _, port = address.rpartition(':')
+    if host == '':
+        return port, DEFAULT_PORT
+    return host, int(port)
+
+
+def file_hash(path: os.PathLike) -> str:
+    content_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def to_wire(contents: Union[str, bytes, None]) -> Optional[str]:
+    """Raw bytes are sent as latin-1 text, which maps them to characters one to one"""
+    if isinstance(contents, bytes):
+        return contents.decode('latin-1')
+    return contents
+
+
+def serialize_test(test: Test) -> Dict[str, Any]:
+    return {
+        'title': test.title,
+        'binary': test.binary,
+        'encoding': test.text_encoding,
+        'quotes': test.quotes_framed_path,
+        'features': {tag.value: to_wire(test.get_feature(tag).merged_contents()) for tag in EXECUTION_TAGS},
+    }
+
+
+def deserialize_test(message: Dict[str, Any]) -> Test:
+    test = Test(message['title'])
+    test.text_encoding = message['encoding']
+    test.quotes_framed_path = message['quotes']
+    for tag, contents in message['features'].items():
+        test.replace_feature(Feature(Tag(tag), [contents]))
+    if message['binary']:
+        test.to_bytes()
+    return test
+
+
+class Connection:
+    """JSON lines over TCP, one request at a time"""
+
+    def __init__(self, address: Tuple[str, int], timeout: Optional[float] = REQUEST_MARGIN):
+        self.address = address
+        self._socket = socket.create_connection(address, timeout=timeout)
+        self._file = self._socket.makefile('rwb')
+
+    def request(self, message: Dict[str, Any], timeout: Optional[float] = REQUEST_MARGIN) -> Dict[str, Any]:
+        self._socket.settimeout(timeout)
+        self._file.write(json.dumps(message).encode() + b'\n')
+        self._file.flush()
+
+        reply = self._file.readline()
+        if not reply:
+            raise ConnectionError('Worker ' + str(self.address) + ' closed connection')
+        return json.loads(reply)
+
+    def close(self) -> None:
+        try:
+            self._file.close()
+        finally:
+            self._socket.close()
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                reply = self.server.serve(json.loads(line))
+            except Exception as error:  # the same request would break any worker, so it is not a worker's loss
+                reply = {'error': type(error).__name__ + ': ' + str(error)}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            self.wfile.flush()
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    """Runs tests sent by WorkerPool. Executables are stored by content hash, so each one is sent only once"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], jobs: int = 1):
+        super(WorkerServer, self).__init__(address, WorkerHandler)
+        self.jobs = jobs
+        self._slots = threading.Semaphore(jobs)
+        self._storage = TemporaryDirectory()
+        self._storage_lock = threading.Lock()
+
+    def executable_path(self, content_hash: str) -> str:
+        return os.path.join(self._storage.name, content_hash)
+
+    def serve(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        if message['type'] == 'hello':
+            return {'jobs': self.jobs}
+
+        if re.fullmatch('[0-9a-f]{64}', message.get('hash', '')) is None:
+            return {'error': 'Invalid hash'}
+
+        if message['type'] == 'has':
+            return {'present': os.path.exists(self.executable_path(message['hash']))}
+
+        if message['type'] == 'put':
+            data = base64.b64decode(message['data'])
+            if hashlib.sha256(data).hexdigest() != message['hash']:
+                return {'error': 'Hash mismatch'}
+
+            with self._storage_lock:
+                path = self.executable_path(message['hash'])
+                with open(path + '.part', 'wb') as f:
+                    f.write(data)
+                os.chmod(path + '.part', 0o755)
+                os.replace(path + '.part', path)
+            return {}
+
+        if message['type'] == 'run':
+            path = self.executable_path(message['hash'])
+            if not os.path.exists(path):
+                return {'error': UNKNOWN_EXECUTABLE}
+
+            test = deserialize_test(message['test'])
+            background_groups = BackgroundGroups()
+            with self._slots, TemporaryDirectory() as cwd:
+                try:
+                    test.execute(path, message['timeout'], cwd=cwd, background_groups=background_groups,
+                                 output_limit=message.get('output_limit'))
+                finally:
+                    background_groups.sweep()
+
+            return {'output': to_wire(test.prog_output), 'elapsed': test.elapsed, 'stage_failed': test.stage_failed,
+                    'timed_out': test.timed_out, 'output_limit_exceeded': test.output_limit_exceeded}
+
+        return {'error': 'Unknown request'}
+
+    def server_close(self) -> None:
+        super(WorkerServer, self).server_close()
+        self._storage.cleanup()
+
+
+class WorkerPool:
+    """Connections to remote workers, as many to each as it runs tests in parallel.
+    Tests are taken by whichever connection is free, tests of lost workers are retried on other ones.
+    A test is given up after it was running on retries + 1 lost workers or when no workers are left"""
+
+    def __init__(self, addresses: Sequence[str], exec_path: os.PathLike, retries: int = 2):
+        self.retries = retries
+        self.slots = 0
+        self.warning_messages: List[str] = []
+
+        self._hash = file_hash(exec_path)
+        self._exec_path = exec_path
+        self._idle: 'Queue[Optional[Connection]]' = Queue()
+        self._lock = threading.Lock()
+        self._lost: Set[Tuple[str, int]] = set()
+
+        for address in addresses:
+            try:
+                self._connect(parse_address(address))
+            except (OSError, ValueError) as error:
+                self.warning_messages.append('Failed to connect to worker ' + address + ': ' + str(error))
+
+        if self.slots == 0:
+            raise ConnectionError('\n'.join(['No workers available!'] + self.warning_messages))
+
+    def _connect(self, address: Tuple[str, int]) -> None:
+        connection = Connection(address)
+        try:
+            jobs = connection.request({'type': 'hello'})['jobs']
+            if not connection.request({'type': 'has', 'hash': self._hash})['present']:
+                self._upload(connection)
+
+            connections = [connection] + [Connection(address) for _ in range(jobs - 1)]
+        except BaseException:
+            connection.close()
+            raise
+
+        for connection in connections:
+            self._idle.put(connection)
+        with self._lock:
+            self.slots += len(connections)
+
+    def _upload(self, connection: Connection) -> None:
+        with open(self._exec_path, 'rb') as f:
+            data = base64.b64encode(f.read()).decode()
+
+        reply = connection.request({'type': 'put', 'hash': self._hash, 'data': data})
+        if 'error' in reply:
+            raise ConnectionError(reply['error'])
+
+    def _lose(self, connection: Connection) -> bool:
+        """Closes connection, other connections to the same worker are closed when taken from the queue.
+        Returns True if the worker was not known to be lost before"""
+        connection.close()
+        with self._lock:
+            first = connection.address not in self._lost
+            self._lost.add(connection.address)
+            self.slots -= 1
+            if self.slots == 0:
+                self._idle.put(None)  # wakes up everyone waiting for a connection
+        return first
+
+    def _take(self) -> Optional[Connection]:
+        """Waits for a free connection to a worker that is not lost. Returns None if there are no workers left"""
+        while True:
+            connection = self._idle.get()
+            if connection is None:
+                self._idle.put(None)
+                return None
+
+            with self._lock:
+                lost = connection.address in self._lost
+            if not lost:
+                return connection
+            self._lose(connection)
+
+    def execute(self, test: Test, timeout: float, profiler: Profiler = DISABLED_PROFILER,
+                output_limit: Optional[int] = None) -> None:
+        """Runs test on one of the workers storing its output"""
+        request = {'type': 'run', 'hash': self._hash, 'test': serialize_test(test), 'timeout': timeout,
+                   'output_limit': output_limit}
+        error_message = 'loss of workers'
+        losses = 0
+
+        while losses <= self.retries:
+            connection = self._take()
+            if connection is None:
+                break
+
+            try:
+                with profiler.span('remote', title=test.title, worker=str(connection.address)):
+                    reply = connection.request(request, 3 * timeout + REQUEST_MARGIN)
+                    if reply.get('error') == UNKNOWN_EXECUTABLE:  # worker was restarted
+                        self._upload(connection)
+                        reply = connection.request(request, 3 * timeout + REQUEST_MARGIN)
+            except (OSError, ValueError):
+                if self._lose(connection):
+                    losses += 1
+                continue
+
+            self._idle.put(connection)
+            if 'error' in reply:
+                error_message = 'worker error: ' + reply['error']
+                break
+
+            output = reply['output']
+            test.prog_output = output.encode('latin-1') if test.binary and not reply['stage_failed'] else output
+            test.elapsed = reply['elapsed']
+            test.stage_failed = reply['stage_failed']
+            test.timed_out = reply.get('timed_out', False)
+            test.output_limit_exceeded = reply.get('output_limit_exceeded', False)
+            return
+
+        test.prog_output = 'The program was not executed due to ' + error_message + '.'
+        test.elapsed = None
+        test.stage_failed = True
+        test.timed_out = False
+        test.output_limit_exceeded = False
+
+    def run(self, test: Test, timeout: float, profiler: Profiler = DISABLED_PROFILER,
+            epsilon: float = float(Feature.default_content(Tag.EPSILON)), output_limit: Optional[int] = None) -> bool:
+        """Same as Test.run, but on one of the workers. Returns True if run succeeded"""
+        with profiler.span('test', title=test.title):
+            self.execute(test, timeout, profiler, output_limit)
+            return test.judge(profiler, epsilon)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            connection = self._idle.get()
+            if connection is not None:
+                connection.close()
@@ -0,0 +1,139 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Optional, TextIO
+
+import json
+import re
+from xml.sax.saxutils import escape, quoteattr
+
+from tester.features import Tag, display_text
+from tester.testmanip import Test
+
+# outputs of programs are truncated in reports to keep them small
+MAX_REPORTED_OUTPUT: int = 4096
+
+# characters that are not allowed anywhere in XML 1.0 documents, even escaped
+XML_INVALID_CHARS = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+
+def truncate(text: Optional[str], limit: int = MAX_REPORTED_OUTPUT) -> Optional[str]:
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit] + '... (' + str(len(text) - limit) + ' more characters)'
+
+
+def xml_safe(text: str) -> str:
+    """Replaces characters that XML can not contain"""
+    return XML_INVALID_CHARS.sub('\ufffd', text)
+
+
+def verdict(test: Test) -> str:
+    if test.timed_out:
+        return 'time limit exceeded'
+    if test.output_limit_exceeded:
+        return 'output limit exceeded'
+    return 'failed' if test.failed else 'passed'
+
+
+class Reporter(ABC):
+    """Writes results of tests as soon as they finish"""
+
+    def __init__(self, report_file: TextIO):
+        self.report_file = report_file
+
+    def start(self, suite_name: str) -> None:
+        pass
+
+    @abstractmethod
+    def report(self, test: Test) -> None:
+        """Writes result of test run"""
+
+    @abstractmethod
+    def report_memcheck(self, test: Test) -> None:
+        """Writes result of test check with valgrind"""
+
+    def finish(self) -> None:
+        pass
+
+
+class NdjsonReporter(Reporter):
+    """Writes every result as a separate JSON line"""
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self.report_file.write(json.dumps(record) + '\n')
+        self.report_file.flush()
+
+    def report(self, test: Test) -> None:
+        self._write({
+            'type': 'test',
+            'title': test.title,
+            'comment': test.get_feature(Tag.COMMENT).merged_contents(),
+            'verdict': verdict(test),
+            'time': test.elapsed,
+            'output': truncate(display_text(test.prog_output)),
+        })
+
+    def report_memcheck(self, test: Test) -> None:
+        self._write({
+            'type': 'memcheck',
+            'title': test.title,
+            'verdict': 'failed' if test.memcheck_errors else 'passed',
+            'errors': test.memcheck_errors,
+        })
+
+
+class JUnitReporter(Reporter):
+    """Writes results as JUnit XML test cases"""
+
+    def start(self, suite_name: str) -> None:
+        self.report_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.report_file.write('<testsuite name=' + quoteattr(xml_safe(suite_name)) + '>\n')
+        self.report_file.flush()
+
+    def _write_case(self, name: str, elapsed: Optional[float], failure: Optional[str]) -> None:
+        case = '  <testcase classname="vival" name=' + quoteattr(xml_safe(name))
+        if elapsed is not None:
+            case += ' time="{:.6f}"'.format(elapsed)
+
+        if failure is None:
+            case += '/>\n'
+        else:
+            case += '>\n    <failure message="failed">' + escape(xml_safe(failure)) + '</failure>\n  </testcase>\n'
+
+        self.report_file.write(case)
+        self.report_file.flush()
+
+    def report(self, test: Test) -> None:
+        failure = (truncate(display_text(test.prog_output)) or '') if test.failed else None
+        self._write_case(test.title, test.elapsed, failure)
+
+    def report_memcheck(self, test: Test) -> None:
+        failure = '\n'.join(test.memcheck_errors) if test.memcheck_errors else None
+        self._write_case(test.title + ' (valgrind)', None, failure)
+
+    def finish(self) -> None:
+        self.report_file.write('</testsuite>\n')
+        self.report_file.flush()
+
+
+class MultiReporter(Reporter):
+    """Passes results to several reporters"""
+
+    def __init__(self, reporters: Iterable[Reporter]):
+        super(MultiReporter, self).__init__(None)
+        self.reporters = list(reporters)
+
+    def start(self, suite_name: str) -> None:
+        for reporter in self.reporters:
+            reporter.start(suite_name)
+
+    def report(self, test: Test) -> None:
+        for reporter in self.reporters:
+            reporter.report(test)
+
+    def report_memcheck(self, test: Test) -> None:
+        for reporter in self.reporters:
+            reporter.report_memcheck(test)
+
+    def finish(self) -> None:
+        for reporter in self.reporters:
+            reporter.finish()
@@ -0,0 +1,67 @@
+import itertools
+import os
+import shutil
+import stat
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+# tmpfs keeps scratch directories in memory
+SHM_PATH = '/dev/shm'
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Hardlinks read-only files, since tests can not change them in place. Copies other files"""
+    if not os.stat(src).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH):
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass  # different file systems
+
+    shutil.copy2(src, dst)
+
+
+class ScratchSpace:
+    """Provides isolated working directories populated with fixtures"""
+
+    def __init__(self, fixtures: Iterable[os.PathLike] = (), base_dir: Optional[str] = None):
+        if base_dir is None and os.path.isdir(SHM_PATH) and os.access(SHM_PATH, os.W_OK):
+            base_dir = SHM_PATH
+
+        self.root = tempfile.mkdtemp(prefix='vival-', dir=base_dir)
+        self.fixtures = [os.path.abspath(fixture) for fixture in fixtures]
+
+        self._counter = itertools.count()
+        self._remover = ThreadPoolExecutor(max_workers=1)
+
+    def create(self) -> str:
+        """Creates new directory with copies of fixtures"""
+        path = os.path.join(self.root, str(next(self._counter)))
+        os.mkdir(path)
+
+        for fixture in self.fixtures:
+            target = os.path.join(path, os.path.basename(fixture.rstrip(os.sep)))
+            if os.path.isdir(fixture):
+                shutil.copytree(fixture, target, copy_function=link_or_copy)
+            else:
+                link_or_copy(fixture, target)
+
+        return path
+
+    def remove(self, path: str) -> None:
+        """Removes directory in background"""
+        self._remover.submit(shutil.rmtree, path, True)
+
+    @contextmanager
+    def directory(self) -> Iterator[str]:
+        path = self.create()
+        try:
+            yield path
+        finally:
+            self.remove(path)
+
+    def close(self) -> None:
+        self._remover.shutdown(wait=True)
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,485 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import closing, nullcontext
+from enum import Enum
+from tempfile import TemporaryDirectory
+from typing import Optional, Tuple, List, Dict, Set, Any, Callable, ContextManager, TextIO, Union, NamedTuple, Sequence, Iterator
+
+import io
+import os
+import random
+import sys
+import threading
+
+from tester.testmanip import TestsParser, ParseFormat, Test
+from tester.compiler import Compiler
+from tester.lang import Lang, detect_lang
+from tester.memcheck import find_valgrind, valgrind_command
+from tester.profiling import Profiler, DISABLED_PROFILER
+from tester.process import BackgroundGroups
+from tester.remote import WorkerPool
+from tester.scratch import ScratchSpace
+from tester.report import Reporter, MultiReporter
+
+
+class Mode(Enum):
+    TEST = 'test'
+    FILL = 'fill'
+
+
+class ParseResult(NamedTuple):
+    ok: bool
+    ntests: int
+    error_message: Optional[str]
+    warning_messages: List[str]
+
+
+class CompileResult(NamedTuple):
+    ok: bool
+    executable_path: Optional[str]
+    error_message: Optional[str]
+
+
+class TestResult(NamedTuple):
+    title: str
+    failed: bool
+    output: Union[str, bytes, None]
+    elapsed: Optional[float]
+    memcheck_errors: Optional[List[str]]
+
+
+class RunResult(NamedTuple):
+    ok: bool
+    error_message: Optional[str]
+    warning_messages: List[str]
+    suitable: int
+    passed: int
+    duplicates: int
+    unchecked: int  # tests valgrind did not complete on
+    tests: List[TestResult]
+
+
+def compile_source(src_path: str, lang: Lang, tempdir_name: str, flags: str, main_code: Optional[str],
+                   profiler: Profiler = DISABLED_PROFILER) -> Tuple[Optional[str], Compiler]:
+    """Compiles src_path. Returns path to executable (None if compilation failed) and used compiler"""
+    with profiler.span('compile', flags=flags):
+        compiler = Compiler(lang=lang, temp_dir=tempdir_name, flags=flags)
+        return compiler.compile(src_path, main_code), compiler
+
+
+class Session:
+    """Tests one program against one tests file. All state, including configuration, belongs to the instance,
+    so independent sessions may be used from different threads at once. Calls on one session are serialized.
+    Parsed tests and compiled executable are kept between calls, so that only changed parts are redone"""
+
+    def __init__(self, source_path: os.PathLike, tests_path: Optional[os.PathLike] = None, lang: Lang = Lang.CPP,
+                 mode: Mode = Mode.TEST, encoding: Optional[str] = None, binary: bool = False,
+                 old_format: bool = False, add_quotes: bool = False, valgrind: bool = False,
+                 valgrind_sample: int = -1, valgrind_on_fail_only: bool = False, valgrind_jobs: int = 1,
+                 timeout_factor: Optional[float] = None, timeout_floor: float = 0.1,
+                 timeout_calibration: float = 1.0, jobs: int = 1, isolate: bool = False, dedup: bool = False,
+                 break_fail: int = -1, workers: Sequence[str] = ()):
+        self.source_path = os.path.abspath(source_path)
+        self.tests_path = os.path.abspath(tests_path) if tests_path is not None else None  # stdin if None
+
+        self.lang = detect_lang(self.source_path)
+        if self.lang is None:
+            self.lang = lang
+
+        self.mode = Mode(mode)
+        self.encoding = encoding
+        self.binary = binary
+        self.old_format = old_format
+        self.add_quotes = add_quotes
+        self.valgrind = valgrind
+        self.valgrind_sample = valgrind_sample
+        self.valgrind_on_fail_only = valgrind_on_fail_only
+        self.valgrind_jobs = valgrind_jobs
+        self.timeout_factor = timeout_factor
+        self.timeout_floor = timeout_floor
+        self.timeout_calibration = timeout_calibration
+        self.jobs = jobs
+        self.isolate = isolate
+        self.dedup = dedup
+        self.break_fail = break_fail
+        self.workers = list(workers)  # host:port of remote workers, tests run locally if empty
+
+        self.parser: Optional[TestsParser] = None
+        self.tests: List[Test] = []
+        self.failed_titles: Set[str] = set()
+
+        self._lock = threading.RLock()
+        self._tempdir = TemporaryDirectory()
+        self._compile_pool = ThreadPoolExecutor(max_workers=1)
+        self._background_groups = BackgroundGroups()
+        self._compile_job: Optional[Future] = None
+        self._compiled_build: Optional[Tuple[str, Optional[str]]] = None
+        self._compiled_path: Optional[str] = None
+
+    def needs_compilation(self) -> bool:
+        return self.lang == Lang.CPP or self.lang == Lang.C
+
+    def parsed(self) -> bool:
+        """True if the last parse succeeded"""
+        return self.parser is not None and self.parser.parse_details['error_message'] is None
+
+    def parse(self, tests_file: Optional[TextIO] = None, profiler: Profiler = DISABLED_PROFILER) -> ParseResult:
+        """Parses tests from tests_file (tests_path by default). Compilation starts as soon as the first test
+        is parsed, since FLAGS and MAIN usually precede tests; in case they are redefined later,
+        the source is recompiled by compile"""
+        with self._lock:
+            self.parser = TestsParser(ParseFormat.OLD if self.old_format else ParseFormat.NEW,
+                                      expect_filled_tests=(self.mode == Mode.TEST), encoding=self.encoding,
+                                      exec_quotes=self.add_quotes, binary=self.binary)
+            self.tests = []
+
+            warning_messages = []
+            with profiler.span('parse'), self._open_tests(tests_file) as tests_file:
+                for test in self.parser.iter_parse(tests_file):
+                    if len(self.tests) == 0:
+                        warning_messages += self._delete_sanitizers()
+                        if self.needs_compilation() and self._needs_build(self._build_options()):
+                            self._start_compilation(self._build_options(), profiler)
+
+                    self.tests.append(test)
+
+            details = self.parser.parse_details
+            if details['error_message'] is not None:
+                if self._compile_job is not None:
+                    self._compiled_path, _ = self._compile_job.result()
+                    self._compile_job = None
+
+                return ParseResult(False, details['ntests'], details['error_message'], details['warning_messages'])
+
+            warning_messages += self._delete_sanitizers()
+            return ParseResult(True, details['ntests'], None, details['warning_messages'] + warning_messages)
+
+    def invalidate_build(self) -> None:
+        """Makes the next compile (or parse) rebuild the source, e.g. after it has changed"""
+        with self._lock:
+            self._compiled_path = None
+
+    def apply_changes(self, changed_paths: Set[str]) -> bool:
+        """Forgets the build if the source has changed. Returns True if tests have to be parsed again"""
+        with self._lock:
+            if self.source_path in changed_paths:
+                self.invalidate_build()
+            return self.tests_path in changed_paths or not self.parsed()
+
+    def compile(self, profiler: Profiler = DISABLED_PROFILER) -> CompileResult:
+        """Makes sure the source is compiled with the final FLAGS and MAIN of parsed tests file"""
+        with self._lock:
+            if not self.needs_compilation():
+                self._compiled_path = self.source_path
+                return CompileResult(True, self._compiled_path, None)
+
+            final_build = self._build_options()
+            if self._compile_job is None and self._needs_build(final_build):
+                self._start_compilation(final_build, profiler)
+            elif self._compile_job is not None and self._compiled_build != final_build:
+                self._compile_job.result()  # both builds share temporary files
+                self._start_compilation(final_build, profiler)
+
+            if self._compile_job is not None:
+                with profiler.span('compile wait'):
+                    self._compiled_path, compiler = self._compile_job.result()
+                self._compile_job = None
+
+                if self._compiled_path is None:
+                    return CompileResult(False, None, compiler.compile_details['error_message'])
+
+            return CompileResult(True, self._compiled_path, None)
+
+    def suitable_tests(self) -> List[Test]:
+        """Tests that run processes in current mode"""
+        with self._lock:
+            return [test for test in self.tests if self._is_suitable(test)]
+
+    def run(self, reporter: Optional[Reporter] = None, progress: Optional[Callable[[int], None]] = None,
+            profiler: Profiler = DISABLED_PROFILER) -> RunResult:
+        """Runs parsed tests on compiled program, filling them in fill mode.
+        reporter gets results as soon as they are ready, progress gets numbers of finished tests"""
+        with self._lock:
+            try:
+                return self._run(reporter if reporter is not None else MultiReporter([]), progress, profiler)
+            finally:
+                self._background_groups.sweep()
+
+    def report(self, result: RunResult, ntests: int = 5) -> str:
+        """Text summary of run result with details on up to ntests failed tests"""
+        with self._lock:
+            lines = ['\n' + str(self.parser) + '\n']
+
+            if result.passed < result.suitable:
+                lines.append('Failed on these tests:\n')
+
+                failed_tests = [test for test in self.tests if test.failed]
+                for test in failed_tests[:ntests]:
+                    lines.append(test.last_run_details())
+
+            if self.dedup and result.suitable > 0:
+                lines.append('Duplicate executions: ' + str(result.duplicates) + '/' + str(result.suitable)
+                             + ' ({:.1f}%)'.format(100 * result.duplicates / result.suitable))
+
+            if self.mode == Mode.TEST:
+                lines.append('Passed tests: ' + str(result.passed) + '/' + str(result.suitable))
+
+            if self.mode == Mode.FILL:
+                lines.append('Filled tests: ' + str(result.passed) + '/' + str(result.suitable))
+
+            return '\n'.join(lines)
+
+    def write_tests(self, output_filename: os.PathLike, profiler: Profiler = DISABLED_PROFILER) -> None:
+        """Writes parsed (and maybe filled) tests to output_filename"""
+        with self._lock, profiler.span('write tests'):
+            self.parser.write_tests(self.tests, output_filename)
+
+    def close(self) -> None:
+        with self._lock:
+            self._compile_pool.shutdown(wait=True)
+            self._background_groups.sweep()
+            self._tempdir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _open_tests(self, tests_file: Optional[TextIO]) -> ContextManager[TextIO]:
+        if tests_file is not None:
+            return nullcontext(tests_file)
+        if self.tests_path is not None:
+            return self.parser.open_tests_file(self.tests_path)
+        if self.binary:
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='latin-1', newline='')
+        return nullcontext(sys.stdin)
+
+    def _delete_sanitizers(self) -> List[str]:
+        if self.parser.get_sanitizers() and self.valgrind:
+            self.parser.delete_sanitizers()
+            return ['Valgrind is enabled, so sanitizers were deleted from flags\n']
+
+        return []
+
+    def _build_options(self) -> Tuple[str, Optional[str]]:
+        return self.parser.get_flags(), self.parser.get_main() if self.parser.has_main() else None
+
+    def _needs_build(self, build: Tuple[str, Optional[str]]) -> bool:
+        return self._compiled_path is None or build != self._compiled_build
+
+    def _start_compilation(self, build: Tuple[str, Optional[str]], profiler: Profiler) -> None:
+        self._compiled_build = build
+        self._compile_job = self._compile_pool.submit(compile_source, self.source_path, self.lang,
+                                                      self._tempdir.name, *build, profiler)
+
+    def _is_suitable(self, test: Test) -> bool:
+        return (test.filled and self.mode == Mode.TEST) or (not test.filled and self.mode == Mode.FILL)
+
+    def _run(self, reporter: Reporter, progress: Optional[Callable[[int], None]], profiler: Profiler) -> RunResult:
+        if not self.parsed():
+            return RunResult(False, 'Tests were not parsed', [], 0, 0, 0, 0, [])
+
+        if self._compiled_path is None or self._compile_job is not None:
+            return RunResult(False, 'Program was not compiled', [], 0, 0, 0, 0, [])
+
+        program_path = self._compiled_path
+        executable_path = self._compiled_path
+
+        if self.parser.get_checker():
+            executable_path = ' '.join([os.path.abspath(self.parser.get_checker()), executable_path])
+
+        valgrind_path = None
+        if self.valgrind:
+            valgrind_path = find_valgrind()
+            if valgrind_path is None:
+                return RunResult(False, 'Valgrind not found!', [], 0, 0, 0, 0, [])
+
+        warning_messages = []
+        remote = None
+        if self.workers:
+            if self.parser.get_checker():
+                return RunResult(False, 'CHECKER is not supported by remote workers!', [], 0, 0, 0, 0, [])
+            if self.parser.get_fixtures():
+                return RunResult(False, 'FIXTURES are not supported by remote workers!', [], 0, 0, 0, 0, [])
+
+            try:
+                remote = WorkerPool(self.workers, program_path)
+            except ConnectionError as error:
+                return RunResult(False, str(error), [], 0, 0, 0, 0, [])
+            warning_messages += remote.warning_messages
+
+        reporter.start(str(self.parser))
+        try:
+            return self._run_tests(reporter, progress, profiler, program_path, executable_path, valgrind_path,
+                                   remote, warning_messages)
+        finally:
+            reporter.finish()  # reports stay complete when testing is interrupted
+            if remote is not None:
+                remote.close()
+
+    def _run_tests(self, reporter: Reporter, progress: Optional[Callable[[int], None]], profiler: Profiler,
+                   program_path: str, executable_path: str, valgrind_path: Optional[str],
+                   remote: Optional[WorkerPool], warning_messages: List[str]) -> RunResult:
+        passed = 0
+        failed = 0
+        suitable = 0
+
+        timeout = self.parser.get_timeout()
+        epsilon = self.parser.get_epsilon()
+        output_limit = self.parser.get_output_limit()
+
+        for test in self.tests:
+            test.reset()
+
+        # each run of the program gets its own working directory with fixtures
+        scratch = ScratchSpace(self.parser.get_fixtures()) if self.isolate else None
+
+        # memory checks run in parallel with the main run, so their output never mixes with program's
+        memcheck_pool = ThreadPoolExecutor(max_workers=self.valgrind_jobs) if self.valgrind else None
+        memchecks: List[Tuple[Test, Future]] = []
+
+        try:
+            def working_directory() -> ContextManager[Optional[str]]:
+                return scratch.directory() if scratch is not None else nullcontext()
+
+            def test_timeout(test: Test) -> float:
+                return test.adaptive_timeout(timeout, self.timeout_factor, self.timeout_floor, self.timeout_calibration)
+
+            def memcheck_test(test: Test, xml_path: str) -> Optional[List[str]]:
+                with working_directory() as cwd:
+                    return test.memcheck(program_path, valgrind_command(valgrind_path, xml_path), xml_path,
+                                         test_timeout(test), profiler, cwd, self._background_groups)
+
+            def start_memcheck(test: Test) -> None:
+                xml_path = os.path.join(self._tempdir.name, 'memcheck' + str(len(memchecks)) + '.xml')
+                memchecks.append((test, memcheck_pool.submit(memcheck_test, test, xml_path)))
+
+            # without isolation a check shares working directory with the main run of the same test,
+            # so checks of tests with STARTUP or CLEANUP wait until the main run is done
+            deferred_memchecks: Set[int] = set()
+
+            if self.valgrind and not self.valgrind_on_fail_only:
+                candidates = [test for test in self.tests if self._is_suitable(test)]
+                if 0 <= self.valgrind_sample < len(candidates):
+                    candidates = random.sample(candidates, self.valgrind_sample)
+
+                for test in candidates:
+                    if not self.isolate and test.changes_environment():
+                        deferred_memchecks.add(id(test))
+                    else:
+                        start_memcheck(test)
+
+            succeeded_tests = []
+
+            # tests failed on the previous run go first
+            run_order = sorted(self.tests, key=lambda t: t.title not in self.failed_titles)
+
+            # tests with the same execution key and time limit share a single run of the program
+            groups: Dict[Any, List[Test]] = {}
+            for test in run_order:
+                if self._is_suitable(test):
+                    key = (test.execution_key(), test_timeout(test)) if self.dedup else id(test)
+                    groups.setdefault(key, []).append(test)
+
+            duplicates = 0
+
+            def run_group(group: List[Test]) -> List[bool]:
+                if remote is not None:
+                    results = [remote.run(group[0], test_timeout(group[0]), profiler, epsilon, output_limit)]
+                else:
+                    with working_directory() as cwd:
+                        results = [group[0].run(executable_path, test_timeout(group[0]), profiler, epsilon, cwd,
+                                                self._background_groups, output_limit)]
+
+                return results + [test.reuse_run(group[0], profiler, epsilon) for test in group[1:]]
+
+            def group_results() -> Iterator[Tuple[List[Test], List[bool]]]:
+                """Results of groups in run order. A single job runs in this thread, so that it can be profiled"""
+                jobs = remote.slots if remote is not None else self.jobs
+                if jobs <= 1:
+                    for group in groups.values():
+                        yield group, run_group(group)
+                    return
+
+                with ThreadPoolExecutor(max_workers=jobs) as run_pool:
+                    group_runs = [(group, run_pool.submit(run_group, group)) for group in groups.values()]
+                    try:
+                        for group, job in group_runs:
+                            yield group, job.result()
+                    finally:
+                        for _, pending_job in group_runs:
+                            pending_job.cancel()
+
+            reached: Set[int] = set()
+            stopped_early = False
+
+            with profiler.span('run'), closing(group_results()) as results:
+                for group, group_result in results:
+                    for test, run_succeeded in zip(group, group_result):
+                        suitable += 1
+                        reached.add(id(test))
+
+                        if id(test) in deferred_memchecks:
+                            start_memcheck(test)
+                        elif self.valgrind and self.valgrind_on_fail_only and not run_succeeded \
+                                and (self.valgrind_sample < 0 or len(memchecks) < self.valgrind_sample):
+                            start_memcheck(test)
+
+                        if run_succeeded:
+                            passed += 1
+                            succeeded_tests.append(test)
+                        else:
+                            failed += 1
+
+                        reporter.report(test)
+
+                    duplicates += len(group) - 1
+                    if progress is not None:
+                        progress(len(group))
+
+                    if self.break_fail > 0 and failed >= self.break_fail:
+                        stopped_early = True
+                        break
+
+            unchecked = 0
+            if memcheck_pool is not None:
+                if stopped_early:
+                    for test, job in memchecks:
+                        if id(test) not in reached:
+                            job.cancel()
+                with profiler.span('memcheck wait'):
+                    memcheck_pool.shutdown(wait=True)
+
+                for test, job in memchecks:
+                    if job.cancelled():
+                        continue
+
+                    if test.memcheck_errors is None:
+                        unchecked += 1
+                        continue
+
+                    if len(test.memcheck_errors) > 0:
+                        if not test.failed:
+                            passed -= 1
+                        test.failed = True
+
+                    reporter.report_memcheck(test)
+
+            if self.mode == Mode.FILL:
+                for test in succeeded_tests:
+                    if not test.failed:
+                        test.fill()
+
+            self.failed_titles = {test.title for test in self.tests if test.failed}
+
+            results = [TestResult(test.title, bool(test.failed), test.prog_output, test.elapsed, test.memcheck_errors)
+                       for test in self.tests if test.failed is not None]
+            return RunResult(True, None, warning_messages, suitable, passed, duplicates, unchecked, results)
+        finally:
+            # interrupted runs must not leave checks running or directories in memory behind
+            if memcheck_pool is not None:
+                for _, job in memchecks:
+                    job.cancel()
+                memcheck_pool.shutdown(wait=True)
+            if scratch is not None:
+                scratch.close()
@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import DEVNULL
+from typing import Callable, Iterable, NamedTuple, Optional, Tuple
+
+import os
+import shlex
+import threading
+import time
+
+from tester.features import Tag, Feature
+from tester.lang import Lang, detect_lang
+from tester.process import run_process
+from tester.session import compile_source
+from tester.testmanip import Test, TestsParser
+
+
+class StressResult(NamedTuple):
+    iterations: int
+    elapsed: float
+    mismatch: Optional[Test]  # INPUT and OUTPUT come from generator and reference, program output from solution
+    seed: Optional[int]
+    error_message: Optional[str]
+
+
+def prepare_executable(src_path: str, temp_dir: str, flags: str = '') -> Tuple[Optional[str], Optional[str]]:
+    """Compiles C/C++ sources into temp_dir, other files are used as they are.
+    Returns path to executable and error message"""
+    lang = detect_lang(src_path)
+    if lang != Lang.C and lang != Lang.CPP:
+        return src_path, None
+
+    os.makedirs(temp_dir, exist_ok=True)
+    exec_path, compiler = compile_source(src_path, lang, temp_dir, flags, None)
+    return exec_path, compiler.compile_details['error_message']
+
+
+def make_test(seed: int, input: bytes, expected: bytes, mods: Iterable[str] = ()) -> Test:
+    """Test on generated input with output of reference solution"""
+    test = Test('Seed ' + str(seed))
+    test.add_feature(Feature(Tag.COMMENT, ['Generated with seed ' + str(seed)]))
+    test.add_feature(Feature(Tag.INPUT, [input]))
+
+    output = Feature(Tag.OUTPUT, [expected])
+    output.apply_mod(*mods)
+    test.add_feature(output)
+
+    test.to_bytes()
+    return test
+
+
+def write_mismatch(test: Test, output_filename: str, timeout: float = float(Feature.default_content(Tag.TIMEOUT)),
+                   epsilon: float = float(Feature.default_content(Tag.EPSILON)), flags: str = '',
+                   output_limit: int = int(Feature.default_content(Tag.OUTLIMIT))) -> None:
+    """Writes mismatched test to a binary tests file with TIMEOUT, EPSILON, FLAGS and OUTLIMIT the stress run used"""
+    parser = TestsParser(binary=True)
+    parser.replace_feature(Feature(Tag.TIMEOUT, [str(timeout)]))
+    parser.replace_feature(Feature(Tag.EPSILON, [str(epsilon)]))
+    parser.replace_feature(Feature(Tag.FLAGS, [flags]))
+    parser.replace_feature(Feature(Tag.OUTLIMIT, [str(output_limit)]))
+    parser.write_tests([test], output_filename)
+
+
+def stress(generator_path: str, reference_path: str, solution_path: str, iterations: int, first_seed: int = 1,
+           jobs: int = 1, timeout: float = float(Feature.default_content(Tag.TIMEOUT)),
+           epsilon: float = float(Feature.default_content(Tag.EPSILON)), mods: Iterable[str] = (),
+           output_limit: int = int(Feature.default_content(Tag.OUTLIMIT)),
+           progress: Optional[Callable[[int], None]] = None) -> StressResult:
+    """Runs generator with seeds first_seed, first_seed + 1, ... and compares outputs of reference and solution
+    on generated inputs. Runs in jobs parallel lanes, stops on the first mismatch (the one with the lowest seed).
+    Program streams are passed as raw bytes"""
+    mods = list(mods)
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    done = 0
+    mismatch: Optional[Test] = None
+    mismatch_seed: Optional[int] = None
+    error_message: Optional[str] = None
+
+    def fail(message: str) -> None:
+        nonlocal error_message
+
+        with lock:
+            if error_message is None:
+                error_message = message
+        stop.set()
+
+    def check(seed: int) -> None:
+        nonlocal done, mismatch, mismatch_seed
+
+        generated = run_process(shlex.quote(generator_path) + ' ' + str(seed), timeout=timeout, stderr=DEVNULL)
+        if generated.timed_out or generated.returncode != 0:
+            return fail('Generator failed on seed ' + str(seed))
+
+        expected = run_process(shlex.quote(reference_path), input=generated.output, timeout=timeout,
+                               output_limit=output_limit)
+        if expected.timed_out:
+            return fail('Reference solution exceeded time limit on seed ' + str(seed))
+        if expected.output_limit_exceeded:
+            return fail('Reference solution exceeded output limit on seed ' + str(seed))
+
+        test = make_test(seed, generated.output, expected.output, mods)
+        succeeded = test.run(solution_path, timeout, epsilon=epsilon, output_limit=output_limit)
+
+        with lock:
+            done += 1
+            if not succeeded and (mismatch_seed is None or seed < mismatch_seed):
+                mismatch, mismatch_seed = test, seed
+
+        if progress is not None:
+            progress(1)
+
+    def lane(offset: int) -> None:
+        # seeds below the found mismatch are still checked, so that the result does not depend on timings
+        for seed in range(first_seed + offset, first_seed + iterations, jobs):
+            if stop.is_set() or (mismatch_seed is not None and seed > mismatch_seed):
+                return
+            check(seed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as lanes:
+        try:
+            for job in [lanes.submit(lane, offset) for offset in range(jobs)]:
+                job.result()
+        finally:
+            stop.set()  # lanes finish their current iteration on errors and interrupts
+
+    return StressResult(done, time.perf_counter() - started, mismatch, mismatch_seed, error_message)
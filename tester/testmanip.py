@@ -1,11 +1,17 @@
-from subprocess import PIPE
-import subprocess
+from subprocess import DEVNULL
 
-from typing import Dict, Any, List, Iterable, TextIO
+from typing import Dict, Any, List, Iterable, Iterator, Optional, TextIO, Tuple
 
+import hashlib
 import os
+import shlex
 
-from tester.features import Tag, Feature, construct_test_features, construct_file_features, FeatureContainer
+from tester.features import Tag, Feature, construct_test_features, construct_file_features, FeatureContainer, display_text
+from tester.compression import open_text
+from tester.comparators import COMPARISON_MODS, prepare, compare
+from tester.memcheck import VALGRIND_SLOWDOWN, read_report
+from tester.process import run_process, BackgroundGroups, cut_middle, OUTPUT_EXCERPT_SIZE
+from tester.profiling import Profiler, DISABLED_PROFILER
 
 
 class ParseFormat:
@@ -52,6 +58,99 @@ def align(possible: str, target: str, added_symbol: str) -> bool:
     return False
 
 
+def run_commands(commands: str, timeout: Optional[float] = None, cwd: Optional[str] = None,
+                 background_groups: Optional[BackgroundGroups] = None) -> Optional[str]:
+    """Executes newline separated shell commands, each limited by timeout.
+    Returns the first failed command, if any"""
+    for args in commands.split('\n'):
+        if args != '':
+            result = run_process(args, timeout=timeout, stdout=None, stderr=None, keep_background=True, cwd=cwd,
+                                 background_groups=background_groups)
+            if result.timed_out:
+                return args + ' (time limit exceeded)'
+            if result.returncode != 0:
+                return args
+
+    return None
+
+
+class SectionReader:
+    """Reads tests file chunk by chunk, producing pairs (wild space, bracketed text).
+    Raises ValueError on unmatched brackets"""
+
+    CHUNK_SIZE: int = 1 << 16
+
+    def __init__(self, tests_file: TextIO):
+        self.tests_file = tests_file
+        self.nsections = 0
+        self.rest = ''  # text after the last section, available after exhaustion
+
+        self._buffer = ''
+        self._start = 0  # start of the current section
+        self._lbracket = -1
+        self._scan_pos = 0  # everything before it is already searched
+        self._eof = False
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return self
+
+    def __next__(self) -> Tuple[str, str]:
+        while True:
+            if self._lbracket == -1:
+                self._lbracket = self._buffer.find('/{', self._scan_pos)
+                if self._lbracket == -1:
+                    self._scan_pos = max(self._start, len(self._buffer) - 1)
+                else:
+                    self._scan_pos = self._lbracket + len('/{')
+
+            if self._lbracket != -1:
+                rbracket = self._buffer.find('}/', self._scan_pos)
+                if rbracket != -1:
+                    return self._cut_section(rbracket)
+
+                self._scan_pos = max(self._lbracket + len('/{'), len(self._buffer) - 1)
+
+            if self._eof:
+                return self._finish()
+
+            self._read_chunk()
+
+    def _cut_section(self, rbracket: int) -> Tuple[str, str]:
+        wild_space = self._buffer[self._start: self._lbracket]
+        contents = self._buffer[self._lbracket + len('/{'): rbracket]
+
+        if '}/' in wild_space + '/' or '/{' in contents:
+            raise ValueError('Wrong format! Unmatched number of /{ and }/ brackets.\n')
+
+        self.nsections += 1
+        self._start = self._scan_pos = rbracket + len('}/')
+        self._lbracket = -1
+
+        return wild_space, contents
+
+    def _finish(self):
+        self.rest = self._buffer[self._start:]
+
+        # files without any /{ are in old format
+        if self._lbracket != -1 or (self.nsections > 0 and '}/' in self.rest):
+            raise ValueError('Wrong format! Unmatched number of /{ and }/ brackets.\n')
+
+        raise StopIteration
+
+    def _read_chunk(self) -> None:
+        # reads at least as much as is pending, so that long sections are not copied over and over
+        pending = len(self._buffer) - self._start
+        chunk = self.tests_file.read(max(self.CHUNK_SIZE, pending))
+        if chunk == '':
+            self._eof = True
+
+        self._buffer = self._buffer[self._start:] + chunk
+        self._scan_pos -= self._start
+        if self._lbracket != -1:
+            self._lbracket -= self._start
+        self._start = 0
+
+
 class Test(FeatureContainer):
     """Single extracted test"""
 
@@ -59,25 +158,118 @@ class Test(FeatureContainer):
     USE_QUOTES_FRAMED_PATH: bool = False
 
     def __init__(self, title='Unnamed Test'):
+        self._prepared = None
         super(Test, self).__init__()
         for feature in construct_test_features():
             self.add_feature(feature)
 
         self.title = title
+        self.text_encoding = Test.ENCODING
+        self.quotes_framed_path = Test.USE_QUOTES_FRAMED_PATH
+        self.binary = False
         self.prog_output = None
+        self.elapsed = None
+        self.stage_failed = False
+        self.timed_out = False
+        self.output_limit_exceeded = False
+        self.memcheck_errors = None
         self.failed = None
         self.filled = False
 
-    def validate(self) -> bool:
+    def validate(self, epsilon: float = float(Feature.default_content(Tag.EPSILON))) -> bool:
         """Checks if prog_output is correct"""
-        if 'mSHUFFLED' in self.get_feature(Tag.OUTPUT).mods:
+        mods = self.get_feature(Tag.OUTPUT).mods
+        if 'mSHUFFLED' in mods:
             possible = self.get_feature(Tag.OUTPUT).merged_contents()
-            return align(possible, self.prog_output, self.get_feature(Tag.OUTPUT).join_symbol)
+            output = self.prog_output
+            if self.binary:
+                possible, output = possible.decode('latin-1'), output.decode('latin-1')
+            return align(possible, output, self.get_feature(Tag.OUTPUT).join_symbol)
+
+        for mod in COMPARISON_MODS:
+            if mod in mods:
+                return compare(mod, self._prepared_output(mod), self.prog_output, epsilon)
+
+        return self.get_feature(Tag.OUTPUT).merged_contents() == self.prog_output
+
+    def _prepared_output(self, mod: str) -> Any:
+        """Expected output prepared for comparison with mod, cached between runs"""
+        if self._prepared is None or self._prepared[0] != mod:
+            self._prepared = (mod, prepare(mod, self.get_feature(Tag.OUTPUT).merged_contents()))
+
+        return self._prepared[1]
+
+    def to_bytes(self) -> None:
+        """Keeps INPUT and OUTPUT as raw bytes, so that program streams are neither encoded nor decoded"""
+        for tag in (Tag.INPUT, Tag.OUTPUT):
+            self.get_feature(tag).to_bytes()
+        self.binary = True
+
+    def encoding(self) -> Optional[str]:
+        """Encoding of program streams, None for raw bytes"""
+        return None if self.binary else self.text_encoding
+
+    def reset(self) -> None:
+        """Forgets results of the last run"""
+        self.prog_output = None
+        self.elapsed = None
+        self.stage_failed = False
+        self.timed_out = False
+        self.output_limit_exceeded = False
+        self.memcheck_errors = None
+        self.failed = None
+
+    def run(self, exec_path: os.PathLike, timeout: float = float(Feature.default_content(Tag.TIMEOUT)),
+            profiler: Profiler = DISABLED_PROFILER, epsilon: float = float(Feature.default_content(Tag.EPSILON)),
+            cwd: Optional[str] = None, background_groups: Optional[BackgroundGroups] = None,
+            output_limit: Optional[int] = None) -> bool:
+        """Runs executable on this test in cwd (current directory by default). Returns True if run succeeded"""
+        with profiler.span('test', title=self.title):
+            self.execute(exec_path, timeout, profiler, cwd, background_groups, output_limit)
+            return self.judge(profiler, epsilon)
+
+    def reuse_run(self, test, profiler: Profiler = DISABLED_PROFILER,
+                  epsilon: float = float(Feature.default_content(Tag.EPSILON))) -> bool:
+        """Takes results of the last run of test with the same execution key. Returns True if run succeeded"""
+        self.prog_output = test.prog_output
+        self.elapsed = test.elapsed
+        self.stage_failed = test.stage_failed
+        self.timed_out = test.timed_out
+        self.output_limit_exceeded = test.output_limit_exceeded
+        return self.judge(profiler, epsilon)
+
+    def changes_environment(self) -> bool:
+        """True if the test has STARTUP or CLEANUP commands"""
+        return not self.get_feature(Tag.STARTUP).is_empty() or not self.get_feature(Tag.CLEANUP).is_empty()
+
+    def execution_key(self) -> str:
+        """Hash of features that define program's execution"""
+        key = hashlib.sha256()
+        for tag in (Tag.INPUT, Tag.CMD, Tag.STARTUP, Tag.CLEANUP):
+            contents = self.get_feature(tag).merged_contents()
+            if not isinstance(contents, bytes):
+                contents = contents.encode()
+            key.update(str(len(contents)).encode() + b':' + contents)
+
+        return key.hexdigest()
+
+    def judge(self, profiler: Profiler = DISABLED_PROFILER,
+              epsilon: float = float(Feature.default_content(Tag.EPSILON))) -> bool:
+        """Sets verdict on the last run. Returns True if run succeeded"""
+        if self.stage_failed or self.timed_out or self.output_limit_exceeded:
+            self.failed = True
+        elif self.filled:
+            with profiler.span('validate', title=self.title):
+                self.failed = not self.validate(epsilon)
         else:
-            return self.get_feature(Tag.OUTPUT).merged_contents() == self.prog_output
+            self.failed = False
 
-    def run(self, exec_path: os.PathLike, timeout: float = float(Feature.default_content(Tag.TIMEOUT))) -> bool:
-        """Runs executable on this test. Returns True if run succeeded"""
+        return not self.failed
+
+    def execute(self, exec_path: os.PathLike, timeout: float = float(Feature.default_content(Tag.TIMEOUT)),
+                profiler: Profiler = DISABLED_PROFILER, cwd: Optional[str] = None,
+                background_groups: Optional[BackgroundGroups] = None, output_limit: Optional[int] = None) -> None:
+        """Runs executable on this test storing its output. Output over output_limit bytes is cut"""
         exec_path = os.path.abspath(exec_path)
 
         cmd = self.get_feature(Tag.CMD).merged_contents()
@@ -86,67 +278,117 @@ class Test(FeatureContainer):
         cleanup = self.get_feature(Tag.CLEANUP).merged_contents()
 
         all_args: str = None
-        if (Test.USE_QUOTES_FRAMED_PATH):
+        if (self.quotes_framed_path):
             all_args = '\"' + str(exec_path) + '\" ' + cmd  # Useful for Windows users.
         else:
             all_args = str(exec_path) + ' ' + cmd
 
-        if startup is not None:
-            for args in startup.split('\n'):
-                if args != '':
-                    code = subprocess.call(args, shell=True)  # TODO test this
-                    if code != 0:
-                        self.prog_output = 'The program was not executed due to errors during environment preparation stage. ' \
-                                           'Failed to execute: ' + args
-                        self.failed = True
-                        return not self.failed
-        try:
-            prog_output = subprocess.run(all_args, stderr=subprocess.STDOUT, stdout=PIPE, input=stdin,
-                                         timeout=timeout, encoding=Test.ENCODING, shell=True).stdout
-
-        except subprocess.TimeoutExpired:
-            prog_output = 'Time limit exceeded'
-            self.failed = True
+        self.stage_failed = False
+        self.timed_out = False
+        self.output_limit_exceeded = False
+
+        with profiler.span('startup', title=self.title):
+            failed_command = run_commands(startup, timeout, cwd, background_groups)
+        if failed_command is not None:
+            self.prog_output = 'The program was not executed due to errors during environment preparation stage. ' \
+                               'Failed to execute: ' + failed_command
+            self.stage_failed = True
+            return
+
+        with profiler.span('program', title=self.title):
+            result = run_process(all_args, input=stdin, timeout=timeout, encoding=self.encoding(), cwd=cwd,
+                                 output_limit=output_limit)
+
+        self.elapsed = result.elapsed
+        self.timed_out = result.timed_out
+        self.output_limit_exceeded = result.output_limit_exceeded
+        if result.timed_out:
+            self.prog_output = b'Time limit exceeded' if self.binary else 'Time limit exceeded'
+        else:
+            self.prog_output = result.output
+
+        with profiler.span('cleanup', title=self.title):
+            failed_command = run_commands(cleanup, timeout, cwd, background_groups)
+        if failed_command is not None:
+            self.prog_output = 'Cleanup stage failed. Failed to execute: ' + failed_command
+            self.stage_failed = True
+
+    def memcheck(self, exec_path: os.PathLike, valgrind_prefix: str, xml_path: str,
+                 timeout: float = float(Feature.default_content(Tag.TIMEOUT)),
+                 profiler: Profiler = DISABLED_PROFILER, cwd: Optional[str] = None,
+                 background_groups: Optional[BackgroundGroups] = None) -> Optional[List[str]]:
+        """Runs executable under valgrind on this test. Program output is discarded.
+        Returns found memory errors or None if the check did not complete"""
+        exec_path = os.path.abspath(exec_path)
 
-        self.prog_output = prog_output
+        cmd = self.get_feature(Tag.CMD).merged_contents()
+        stdin = self.get_feature(Tag.INPUT).merged_contents()
 
-        if cleanup is not None:
-            for args in cleanup.split('\n'):
-                if args != '':
-                    code = subprocess.call(args, shell=True)  # TODO test this
-                    if code != 0:
-                        self.prog_output = 'Cleanup stage failed. Failed to execute: ' + args
-                        self.failed = True
-                        return not self.failed
+        all_args = ' '.join([valgrind_prefix, shlex.quote(str(exec_path)), cmd])
 
-        if self.filled:
-            self.failed = not self.validate()
-            return not self.failed
-        else:
-            self.failed = False
-            return not self.failed
+        self.memcheck_errors = None
+        if run_commands(self.get_feature(Tag.STARTUP).merged_contents(), timeout, cwd, background_groups) is not None:
+            return self.memcheck_errors
+
+        with profiler.span('memcheck', title=self.title):
+            result = run_process(all_args, input=stdin, timeout=timeout * VALGRIND_SLOWDOWN, encoding=self.encoding(),
+                                 stdout=DEVNULL, stderr=DEVNULL, cwd=cwd)
+
+        if not result.timed_out:
+            self.memcheck_errors = read_report(xml_path)
+
+        run_commands(self.get_feature(Tag.CLEANUP).merged_contents(), timeout, cwd, background_groups)
+        return self.memcheck_errors
 
     def fill(self) -> None:
-        """Fills in test using last run"""
+        """Fills in test using last run, recording its run time as reference unless the run timed out"""
         self.filled = True
         self.replace_feature(Feature(Tag.OUTPUT, [self.prog_output]))
 
+        if self.elapsed is not None and not self.timed_out:
+            self.replace_feature(Feature(Tag.REFTIME, ['{:.6f}'.format(self.elapsed)]))
+
+    def reference_time(self) -> Optional[float]:
+        """Run time of reference executable recorded in fill mode"""
+        reftime = self.get_feature(Tag.REFTIME).merged_contents()
+        return float(reftime) if reftime != '' else None
+
+    def adaptive_timeout(self, timeout: float, factor: Optional[float] = None, floor: float = 0.0,
+                         calibration: float = 1.0) -> float:
+        """Time limit proportional to reference time. Returns timeout if adaptation is disabled (no factor)
+        or if reference time is unknown"""
+        reftime = self.reference_time()
+        if factor is None or reftime is None:
+            return timeout
+
+        return max(floor, factor * reftime * calibration)
+
     def print_last_run(self) -> None:
         """Prints details on last run"""
-        print('-' * 30)
+        print(self.last_run_details())
 
-        print(self.title + '\n')
+    def last_run_details(self) -> str:
+        """Details on last run as printed by print_last_run"""
+        lines = ['-' * 30, self.title + '\n']
 
         for feature in sorted(self._tag2feature.values()):
             if feature.info() is not None and not feature.is_empty():
                 if feature.info() != '':
-                    print(feature.info() + ':')
-                print(feature.merged_contents() + '\n')
+                    lines.append(feature.info() + ':')
+                lines.append(cut_middle(display_text(feature.merged_contents()), OUTPUT_EXCERPT_SIZE) + '\n')
+
+        if self.output_limit_exceeded:
+            lines.append('PROGRAM OUTPUT (Output limit exceeded, cut):')
+        else:
+            lines.append('PROGRAM OUTPUT:')
+        lines.append(cut_middle(display_text(self.prog_output), OUTPUT_EXCERPT_SIZE) + '\n')
 
-        print('PROGRAM OUTPUT:')
-        print(self.prog_output + '\n')
+        if self.memcheck_errors:
+            lines.append('MEMORY ERRORS:')
+            lines.append('\n'.join(self.memcheck_errors) + '\n')
 
-        print('-' * 30)
+        lines.append('-' * 30)
+        return '\n'.join(lines)
 
     def __str__(self):
         str_repr = ''
@@ -167,22 +409,29 @@ class Test(FeatureContainer):
 
         if feature.tag == Tag.OUTPUT:
             self.filled = True
+            self._prepared = None
+
+    def replace_feature(self, new_feature: Feature) -> None:
+        super(Test, self).replace_feature(new_feature)
+
+        if new_feature.tag == Tag.OUTPUT:
+            self._prepared = None
 
 
 class TestsParser(FeatureContainer):
     """Parses text file with tests"""
 
-    def __init__(self, parse_format: ParseFormat = ParseFormat.NEW, expect_filled_tests: bool = True, encoding: str = None, exec_quotes: bool = None):
-        if encoding is not None:
-            Test.ENCODING = encoding
-        if exec_quotes is not None:
-            Test.USE_QUOTES_FRAMED_PATH = exec_quotes
+    def __init__(self, parse_format: ParseFormat = ParseFormat.NEW, expect_filled_tests: bool = True, encoding: str = None, exec_quotes: bool = None,
+                 binary: bool = False):
         super(TestsParser, self).__init__()
         for feature in construct_file_features():
             self.add_feature(feature)
 
         self.format = parse_format
         self.expect_filled_tests = expect_filled_tests
+        self.encoding = encoding
+        self.exec_quotes = exec_quotes
+        self.binary = binary
         self.parse_details: Dict[str, Any] = {
             'ntests': 0,
             'format': None,
@@ -203,6 +452,9 @@ class TestsParser(FeatureContainer):
     def get_checker(self) -> str:
         return self.get_feature(Tag.CHECKER).merged_contents()
 
+    def get_fixtures(self) -> List[str]:
+        return [path.strip() for path in self.get_feature(Tag.FIXTURES).merged_contents().split('\n') if path.strip() != '']
+
     def get_sanitizers(self) -> List[str]:
         sanitizers = []
         for f in self.get_feature(Tag.FLAGS).merged_contents().split(' '):
@@ -224,33 +476,66 @@ class TestsParser(FeatureContainer):
     def get_timeout(self) -> float:
         return float(self.get_feature(Tag.TIMEOUT).merged_contents())
 
+    def get_epsilon(self) -> float:
+        return float(self.get_feature(Tag.EPSILON).merged_contents())
+
+    def get_output_limit(self) -> int:
+        return int(self.get_feature(Tag.OUTLIMIT).merged_contents())
+
     def parse(self, tests_file: TextIO):
         """Parses tests_file and returns list of Test objects. Returns None in case of an error"""
-        self.parse_details['ntests'] = 0
-        tests = []
+        tests = list(self.iter_parse(tests_file))
 
-        text = tests_file.read()
+        if self.parse_details['error_message'] is not None:
+            return None
 
-        brackets = scan(text, ['/{', '}/'])
+        return tests
 
-        if len(brackets['/{']) == 0 or self.format == ParseFormat.OLD:
-            if self.format == ParseFormat.NEW:
-                self.parse_details['warning_messages'].append('Old format detected!\n')
-            return self.old_parse(text)
+    def iter_parse(self, tests_file: TextIO) -> Iterator[Test]:
+        """Parses tests_file yielding Test objects as soon as they are complete.
+        File features are updated along the way, so they are final only after exhaustion.
+        In case of an error stops and sets parse_details['error_message'].
+        In binary mode tests_file is expected to be opened with open_tests_file()"""
+        for test in self._iter_parse(tests_file):
+            self.configure(test)
+            yield test
+
+    def configure(self, test: Test) -> None:
+        """Applies parser's settings of program execution to test"""
+        if self.encoding is not None:
+            test.text_encoding = self.encoding
+        if self.exec_quotes is not None:
+            test.quotes_framed_path = self.exec_quotes
+        if self.binary:
+            test.to_bytes()
+
+    def open_tests_file(self, path: os.PathLike, mode: str = 'r') -> TextIO:
+        """Opens tests file. In binary mode every byte, line endings included, is kept as is"""
+        if self.binary:
+            return open_text(path, mode, encoding='latin-1', newline='')
+        return open_text(path, mode)
+
+    def _iter_parse(self, tests_file: TextIO) -> Iterator[Test]:
+        self.parse_details['ntests'] = 0
+        self.parse_details['error_message'] = None
 
-        if len(brackets['/{']) != len(brackets['}/']):
-            self.parse_details['error_message'] = 'Wrong format! Unmatched number of /{ and }/ brackets.\n'
-            return None
+        if self.format == ParseFormat.OLD:
+            yield from self.old_parse(tests_file.read())
+            return
 
         curr_test = Test('Test ' + str(self.parse_details['ntests'] + 1))
         filled_fields = set()
         prev_tag = None
 
-        section_start = 0
-        for lbracket_ind, rbracket_ind in zip(brackets['/{'], brackets['}/']):
-            contents = text[lbracket_ind + len('/{'): rbracket_ind]
-
-            wild_space = text[section_start: lbracket_ind]
+        sections = SectionReader(tests_file)
+        while True:
+            try:
+                wild_space, contents = next(sections)
+            except StopIteration:
+                break
+            except ValueError as error:
+                self.parse_details['error_message'] = str(error)
+                return
 
             # search for tag in wild space
             search_results = scan(wild_space, map(lambda t: t.value, Feature.tag_configs.keys()))
@@ -288,9 +573,9 @@ class TestsParser(FeatureContainer):
 
                 if best_tag in filled_fields:
                     # new test has started
-                    tests.append(curr_test)
-
                     self.parse_details['ntests'] += 1
+                    yield curr_test
+
                     curr_test = Test('Test ' + str(self.parse_details['ntests'] + 1))
                     filled_fields = {best_tag}
 
@@ -306,12 +591,13 @@ class TestsParser(FeatureContainer):
 
                 prev_tag = best_tag
 
-            section_start = rbracket_ind + len('}/')
+        if sections.nsections == 0:
+            self.parse_details['warning_messages'].append('Old format detected!\n')
+            yield from self.old_parse(sections.rest)
+            return
 
-        tests.append(curr_test)
         self.parse_details['ntests'] += 1
-
-        return tests
+        yield curr_test
 
     def old_parse(self, text: str):
         tests = []
@@ -355,7 +641,7 @@ class TestsParser(FeatureContainer):
 
     def write_tests(self, tests, output_filename):
         """Writes contents of tests and parser to output_filename"""
-        with open(output_filename, 'w') as tests_file:
+        with self.open_tests_file(output_filename, 'w') as tests_file:
             line_len = 70
 
             tests_file.write('Contents of this file were automatically generated by VIVAL tool.\n\n')
@@ -0,0 +1,90 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+from typing import Iterable, Optional, Set, Tuple
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+
+class Watcher:
+    """Waits for changes of files. Uses inotify on Linux and falls back to polling elsewhere"""
+
+    POLL_INTERVAL: float = 0.3
+    SETTLE_TIME: float = 0.05  # editors often write files in several steps
+
+    def __init__(self, paths: Iterable[os.PathLike]):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self._stamps = {path: self._stamp(path) for path in self.paths}
+        self._inotify_fd = self._init_inotify()
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _init_inotify(self) -> Optional[int]:
+        if not sys.platform.startswith('linux'):
+            return None
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+
+        if fd < 0:
+            return None
+
+        # directories are watched, so that files replaced by rename are noticed as well
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        for directory in {os.path.dirname(path) for path in self.paths}:
+            if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                os.close(fd)
+                return None
+
+        return fd
+
+    def _drain(self) -> None:
+        try:
+            while os.read(self._inotify_fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait(self) -> Set[str]:
+        """Blocks until some of the files change. Returns changed paths"""
+        while True:
+            if self._inotify_fd is not None:
+                select.select([self._inotify_fd], [], [])
+                time.sleep(self.SETTLE_TIME)
+                self._drain()
+            else:
+                time.sleep(self.POLL_INTERVAL)
+
+            changed = set()
+            for path in self.paths:
+                stamp = self._stamp(path)
+                if stamp != self._stamps[path]:
+                    self._stamps[path] = stamp
+                    changed.add(path)
+
+            if changed:
+                return changed
+
+    def close(self) -> None:
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
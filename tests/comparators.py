@@ -0,0 +1,29 @@
+import unittest
+
+from tester.comparators import prepare, compare, trim
+
+
+class ComparatorsTest(unittest.TestCase):
+    def _compare(self, mod: str, expected: str, output: str, epsilon: float = 1e-6) -> bool:
+        return compare(mod, prepare(mod, expected), output, epsilon)
+
+    def test_trim(self):
+        self.assertEqual('1 2\n3', trim('1 2  \n3\t\n\n'))
+        self.assertTrue(self._compare('mTRIM', '1 2\n3\n', '1 2 \n3'))
+        self.assertFalse(self._compare('mTRIM', '1 2\n3', '1  2\n3'))
+
+    def test_tokens(self):
+        self.assertTrue(self._compare('mTOKENS', '1 2\n3', ' 1\t2 3\n'))
+        self.assertFalse(self._compare('mTOKENS', '1 2 3', '1 2'))
+
+    def test_numbers(self):
+        self.assertTrue(self._compare('mFLOAT', 'x 0.5 1000000', 'x 0.5000001 1000000.5'))
+        self.assertFalse(self._compare('mFLOAT', 'x 0.5', 'y 0.5'))
+        self.assertFalse(self._compare('mFLOAT', '0.5', '0.51'))
+        self.assertTrue(self._compare('mFLOAT', '0.5', '0.51', epsilon=0.1))
+        self.assertFalse(self._compare('mFLOAT', '0.5', 'nan'))
+
+    def test_bytes(self):
+        self.assertEqual(b'1 2\n3', trim(b'1 2  \n3\t\n\n'))
+        self.assertTrue(self._compare('mTOKENS', b'\xff 2', b'\xff\t2\n'))
+        self.assertTrue(self._compare('mFLOAT', b'\xff 0.5', b'\xff 0.5000001'))
@@ -0,0 +1,37 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from tester.compression import open_text
+
+
+class OpenTextTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.text = 'INPUT /{1 2 3}/\nOUTPUT /{2 3 4 }/\n' * 100
+
+    def test_round_trip(self):
+        for name in ('tests.txt', 'tests.txt.gz', 'tests.txt.xz', 'tests.txt.bz2'):
+            path = os.path.join(self.tempdir.name, name)
+            with open_text(path, 'w') as f:
+                f.write(self.text)
+
+            with open_text(path) as f:
+                self.assertEqual(self.text, f.read())
+
+    def test_detection_by_contents(self):
+        path = os.path.join(self.tempdir.name, 'tests.txt.gz')
+        with open_text(path, 'w') as f:
+            f.write(self.text)
+
+        renamed_path = os.path.join(self.tempdir.name, 'tests.txt')
+        os.rename(path, renamed_path)
+
+        with open_text(renamed_path) as f:
+            self.assertEqual(self.text, f.read())
+
+        with open(renamed_path, 'rb') as f:
+            self.assertNotEqual(self.text.encode(), f.read())
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
@@ -16,6 +16,13 @@ class FeatureTest(unittest.TestCase):
         self.assertEqual(self.desc.merged_contents(), 'desc')
         self.assertEqual(self.some_content.merged_contents(), '\n')
 
+    def test_to_bytes(self):
+        self.no_content.to_bytes()
+        self.assertEqual(b'', self.no_content.merged_contents())
+
+        self.some_content.to_bytes()
+        self.assertEqual(b'\n', self.some_content.merged_contents())
+
     def test_is_empty(self):
         self.assertTrue(self.no_content.is_empty())
         self.assertTrue(self.empty_content.is_empty())
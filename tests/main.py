@@ -0,0 +1,67 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+import pkg_resources
+from click.testing import CliRunner
+
+try:
+    from tester.__main__ import cli
+except pkg_resources.VersionConflict:  # installed dependencies do not match requirements.txt
+    cli = None
+
+
+@unittest.skipIf(cli is None, 'vival is not installed with matching dependencies')
+class StressCommandTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.scripts_dir = TemporaryDirectory()
+        self.runner = CliRunner(mix_stderr=False)
+
+    def _script(self, name: str, body: str) -> str:
+        path = os.path.join(self.scripts_dir.name, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n' + body + '\n')
+        os.chmod(path, 0o755)
+        return path
+
+    def _stress(self, generator: str, reference: str, solution: str, *options: str):
+        output_path = os.path.join(self.scripts_dir.name, 'stress.txt')
+        return self.runner.invoke(cli, ['stress', '-g', generator, '-r', reference, solution, '-j', '2',
+                                        '-o', output_path, *options], catch_exceptions=False)
+
+    def test_large_outputs(self):
+        # outputs are several chunks long, so they are drained while programs still run
+        generator = self._script('gen', 'seq 1 200000')
+        reference = self._script('ref', 'cat')
+
+        result = self._stress(generator, reference, reference, '-n', '4')
+        self.assertNotIn('Traceback', result.stderr)
+        self.assertIn('Passed tests: 4/4', result.stdout)
+
+    def test_output_limit(self):
+        generator = self._script('gen', 'echo "$1"')
+        reference = self._script('ref', 'cat')
+        solution = self._script('sol', 'yes')
+
+        result = self._stress(generator, reference, solution, '-n', '4', '--output-limit', '1000')
+        self.assertIn('Mismatch on seed 1', result.stdout)
+        self.assertIn('Output limit exceeded', result.stdout)
+
+    def tearDown(self) -> None:
+        self.scripts_dir.cleanup()
+
+
+@unittest.skipIf(cli is None, 'vival is not installed with matching dependencies')
+class CommandGroupTest(unittest.TestCase):
+    def test_help(self):
+        result = CliRunner().invoke(cli, ['--help'])
+        self.assertEqual(0, result.exit_code)
+        self.assertIn('stress', result.output)
+        self.assertIn('worker', result.output)
+
+        result = CliRunner().invoke(cli, ['test', '--help'])
+        self.assertIn('EXECUTABLE_PATH', result.output)
+
+    def test_default_command(self):
+        result = CliRunner().invoke(cli, ['missing.c'])
+        self.assertIn(' test [OPTIONS] EXECUTABLE_PATH', result.output)
@@ -0,0 +1,26 @@
+import unittest
+from tempfile import NamedTemporaryFile
+
+from tester.memcheck import read_report
+
+
+class ReadReportTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.report_file = NamedTemporaryFile(mode='w+', suffix='.xml')
+        self.report_file.write("""<?xml version="1.0"?>
+        <valgrindoutput>
+          <error><kind>InvalidRead</kind><what>Invalid read of size 4</what></error>
+          <error><kind>Leak_DefinitelyLost</kind><xwhat><text>8 bytes are definitely lost</text></xwhat></error>
+        </valgrindoutput>
+        """)
+        self.report_file.flush()
+
+    def test_errors_extraction(self):
+        self.assertEqual(['InvalidRead: Invalid read of size 4',
+                          'Leak_DefinitelyLost: 8 bytes are definitely lost'], read_report(self.report_file.name))
+
+    def test_missing_report(self):
+        self.assertIsNone(read_report(self.report_file.name + '.missing'))
+
+    def tearDown(self) -> None:
+        self.report_file.close()
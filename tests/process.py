@@ -0,0 +1,75 @@
+import os
+import subprocess
+import time
+import unittest
+from unittest import mock
+
+from tester import process
+from tester.process import run_process, sweep_background_groups, OUTPUT_EXCERPT_SIZE
+
+
+def is_alive(pid: int) -> bool:
+    try:
+        with open('/proc/' + str(pid) + '/stat') as stat:
+            return stat.read().split(')')[-1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+@unittest.skipUnless(os.path.isdir('/proc'), 'requires procfs')
+class RunProcessTest(unittest.TestCase):
+    def _assert_killed(self, pid: int) -> None:
+        deadline = time.monotonic() + 2.0
+        while is_alive(pid) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(is_alive(pid))
+
+    def test_output(self):
+        result = run_process('cat', input='1 2 3', timeout=2.0, encoding='ascii')
+        self.assertEqual(('1 2 3', 0, False), result[:3])
+
+    def test_output_limit(self):
+        result = run_process('seq 10', timeout=2.0, encoding='ascii', output_limit=1000)
+        self.assertFalse(result.output_limit_exceeded)
+        self.assertEqual(''.join(str(i) + '\n' for i in range(1, 11)), result.output)
+
+        started = time.monotonic()
+        result = run_process('yes', timeout=10.0, encoding='ascii', output_limit=1 << 20)
+
+        self.assertTrue(result.output_limit_exceeded)
+        self.assertFalse(result.timed_out)
+        self.assertLess(time.monotonic() - started, 5.0)
+        self.assertLessEqual(len(result.output), 2 * OUTPUT_EXCERPT_SIZE + 5)
+        self.assertTrue(result.output.startswith('y\ny\n'))
+        self.assertTrue(result.output.endswith('y\n'))
+
+    def test_output_limit_binary(self):
+        result = run_process('cat', input='', timeout=2.0, output_limit=1000)
+        self.assertEqual(b'', result.output)
+
+    def test_timeout_kills_group(self):
+        started = time.monotonic()
+        result = run_process('sleep 30 & sleep 30', timeout=0.2, encoding='ascii')
+
+        self.assertTrue(result.timed_out)
+        self.assertLess(time.monotonic() - started, 5.0)
+
+    def test_stragglers_killed(self):
+        result = run_process('sleep 30 > /dev/null 2>&1 & echo $!', timeout=2.0, encoding='ascii')
+        self._assert_killed(int(result.output))
+
+    def test_background_sweep(self):
+        result = run_process('sleep 30 > /dev/null 2>&1 & echo $!', timeout=2.0, encoding='ascii', keep_background=True)
+        pid = int(result.output)
+        self.assertTrue(is_alive(pid))
+
+        sweep_background_groups()
+        self._assert_killed(pid)
+
+    def test_no_taskkill_after_exit(self):
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+
+        with mock.patch.object(process.os, 'name', 'nt'), mock.patch.object(process.subprocess, 'run') as run:
+            process.kill_stragglers(exited)
+        run.assert_not_called()
@@ -0,0 +1,37 @@
+import json
+import unittest
+from tempfile import NamedTemporaryFile
+
+from tester.profiling import Profiler
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.profiler = Profiler()
+        with self.profiler.span('run'):
+            for idx in range(3):
+                with self.profiler.span('test', title='Test ' + str(idx + 1)):
+                    pass
+
+    def test_spans(self):
+        self.assertEqual(['test', 'test', 'test', 'run'], [span.name for span in self.profiler.spans])
+        self.assertEqual({'title': 'Test 1'}, self.profiler.spans[0].args)
+
+        disabled = Profiler(enabled=False)
+        with disabled.span('run'):
+            pass
+        self.assertEqual([], disabled.spans)
+
+    def test_summary(self):
+        lines = self.profiler.summary().split('\n')
+        self.assertEqual(3, len(lines))
+        self.assertEqual(['run', '1'], lines[1].split()[:2])
+        self.assertEqual(['test', '3'], lines[2].split()[:2])
+
+    def test_chrome_trace(self):
+        with NamedTemporaryFile(mode='r', suffix='.json') as trace_file:
+            self.profiler.write_chrome_trace(trace_file.name)
+            events = json.load(trace_file)['traceEvents']
+
+        self.assertEqual(4, len(events))
+        self.assertTrue(all(event['ph'] == 'X' for event in events))
@@ -0,0 +1,128 @@
+import os
+import socket
+import threading
+import unittest
+from tempfile import TemporaryDirectory
+
+from tester.features import Feature, Tag
+from tester.remote import WorkerServer, WorkerPool, serialize_test, deserialize_test
+from tester.testmanip import Test
+
+
+def make_test(number: int) -> Test:
+    test = Test('Test ' + str(number))
+    test.add_feature(Feature(Tag.INPUT, [str(number)]))
+    test.add_feature(Feature(Tag.OUTPUT, [str(number + 1) + '\n']))
+    return test
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.scripts_dir = TemporaryDirectory()
+
+        self.program = os.path.join(self.scripts_dir.name, 'inc')
+        with open(self.program, 'w') as f:
+            f.write('#!/bin/sh\nread x; echo $((x + 1))\n')
+        os.chmod(self.program, 0o755)
+
+        self.servers = [self._start_server(jobs) for jobs in (1, 2)]
+        self.addresses = ['127.0.0.1:' + str(server.server_address[1]) for server in self.servers]
+
+    def _start_server(self, jobs: int) -> WorkerServer:
+        server = WorkerServer(('127.0.0.1', 0), jobs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def _start_failing_server(self, jobs: int = 1) -> str:
+        """Accepts connections like a worker, but drops them as soon as a test is sent"""
+        listener = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(listener.close)
+
+        def serve(connection: socket.socket) -> None:
+            with connection, connection.makefile('rwb') as stream:
+                for line in stream:
+                    if b'"run"' in line:
+                        return
+                    stream.write(b'{"jobs": ' + str(jobs).encode() + b', "present": true}\n')
+                    stream.flush()
+
+        def accept() -> None:
+            while True:
+                try:
+                    connection, _ = listener.accept()
+                except OSError:
+                    return
+                threading.Thread(target=serve, args=(connection,), daemon=True).start()
+
+        threading.Thread(target=accept, daemon=True).start()
+        return '127.0.0.1:' + str(listener.getsockname()[1])
+
+    def test_serialization(self):
+        test = make_test(1)
+        test.add_feature(Feature(Tag.CMD, ['-v']))
+        test.to_bytes()
+
+        restored = deserialize_test(serialize_test(test))
+        self.assertEqual(test.execution_key(), restored.execution_key())
+        self.assertTrue(restored.binary)
+
+    def test_run(self):
+        pool = WorkerPool(self.addresses, self.program)
+        self.assertEqual(3, pool.slots)
+
+        tests = [make_test(number) for number in range(10)]
+        self.assertTrue(all(pool.run(test, 5.0) for test in tests))
+        pool.close()
+
+        # the executable is already stored by workers
+        pool = WorkerPool(self.addresses, self.program)
+        self.assertTrue(pool.run(make_test(10), 5.0))
+        pool.close()
+
+    def test_worker_loss(self):
+        pool = WorkerPool([self._start_failing_server()] + self.addresses[:1], self.program)
+        self.assertEqual(2, pool.slots)
+
+        self.assertTrue(all(pool.run(make_test(number), 5.0) for number in range(3)))
+        self.assertEqual(1, pool.slots)
+        pool.close()
+
+    def test_loss_of_worker_with_many_slots(self):
+        pool = WorkerPool([self._start_failing_server(jobs=4)] + self.addresses[:1], self.program, retries=1)
+        self.assertEqual(5, pool.slots)
+
+        # all connections to the lost worker are dropped at once, they do not use up retries of tests
+        self.assertTrue(all(pool.run(make_test(number), 5.0) for number in range(3)))
+        self.assertEqual(1, pool.slots)
+        pool.close()
+
+    def test_test_error(self):
+        program = os.path.join(self.scripts_dir.name, 'utf')
+        with open(program, 'w') as f:
+            f.write('#!/bin/sh\nif [ "$(cat)" = 0 ]; then printf "\\303\\251"; else echo 2; fi\n')
+        os.chmod(program, 0o755)
+
+        pool = WorkerPool(self.addresses, program)
+        broken = make_test(0)
+        broken.text_encoding = 'ascii'
+        self.assertFalse(pool.run(broken, 5.0))
+        self.assertIn('worker error', broken.prog_output)
+
+        # the error does not take workers down
+        self.assertEqual(3, pool.slots)
+        self.assertTrue(all(pool.run(make_test(1), 5.0) for _ in range(3)))
+        pool.close()
+
+    def test_unavailable_workers(self):
+        pool = WorkerPool(self.addresses + ['127.0.0.1:1'], self.program)
+        self.assertEqual(1, len(pool.warning_messages))
+        pool.close()
+
+        with self.assertRaises(ConnectionError):
+            WorkerPool(['127.0.0.1:1'], self.program)
+
+    def tearDown(self) -> None:
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.scripts_dir.cleanup()
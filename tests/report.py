@@ -0,0 +1,74 @@
+import io
+import json
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+from tester.features import Feature, Tag
+from tester.report import NdjsonReporter, JUnitReporter, truncate
+from tester.testmanip import Test
+
+
+class ReporterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.passed_test = Test('passed')
+        self.passed_test.add_feature(Feature(Tag.OUTPUT, ['1']))
+        self.passed_test.reuse_run(self._run_result('1'))
+
+        self.failed_test = Test('failed <&>')
+        self.failed_test.add_feature(Feature(Tag.OUTPUT, ['1']))
+        self.failed_test.reuse_run(self._run_result('2 & <3>'))
+
+    @staticmethod
+    def _run_result(output: str) -> Test:
+        test = Test()
+        test.prog_output = output
+        test.elapsed = 0.5
+        return test
+
+    def test_ndjson(self):
+        report_file = io.StringIO()
+        reporter = NdjsonReporter(report_file)
+
+        reporter.start('suite')
+        reporter.report(self.passed_test)
+        reporter.report(self.failed_test)
+        reporter.finish()
+
+        records = [json.loads(line) for line in report_file.getvalue().splitlines()]
+        self.assertEqual(['passed', 'failed'], [record['verdict'] for record in records])
+        self.assertEqual('2 & <3>', records[1]['output'])
+        self.assertEqual(0.5, records[1]['time'])
+
+    def test_junit(self):
+        report_file = io.StringIO()
+        reporter = JUnitReporter(report_file)
+
+        reporter.start('suite')
+        reporter.report(self.passed_test)
+        reporter.report(self.failed_test)
+        reporter.finish()
+
+        suite = ElementTree.fromstring(report_file.getvalue().split('\n', 1)[1])
+        cases = suite.findall('testcase')
+        self.assertEqual(['passed', 'failed <&>'], [case.get('name') for case in cases])
+        self.assertIsNone(cases[0].find('failure'))
+        self.assertEqual('2 & <3>', cases[1].find('failure').text)
+
+    def test_junit_control_characters(self):
+        test = Test('title\x01')
+        test.add_feature(Feature(Tag.OUTPUT, ['1']))
+        test.reuse_run(self._run_result('\x1b[31m\x00red'))
+
+        report_file = io.StringIO()
+        reporter = JUnitReporter(report_file)
+        reporter.start('suite')
+        reporter.report(test)
+        reporter.finish()
+
+        case = ElementTree.fromstring(report_file.getvalue().split('\n', 1)[1]).find('testcase')
+        self.assertEqual('title\ufffd', case.get('name'))
+        self.assertEqual('\ufffd[31m\ufffdred', case.find('failure').text)
+
+    def test_truncate(self):
+        self.assertEqual('abc', truncate('abc', 3))
+        self.assertEqual('ab... (1 more characters)', truncate('abc', 2))
@@ -0,0 +1,51 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from tester.scratch import ScratchSpace
+
+
+class ScratchSpaceTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.fixtures_dir = TemporaryDirectory()
+
+        self.fixture_file = os.path.join(self.fixtures_dir.name, 'data.txt')
+        with open(self.fixture_file, 'w') as f:
+            f.write('data')
+
+        self.fixture_subdir = os.path.join(self.fixtures_dir.name, 'inputs')
+        os.mkdir(self.fixture_subdir)
+        with open(os.path.join(self.fixture_subdir, 'input.txt'), 'w') as f:
+            f.write('input')
+
+        self.scratch = ScratchSpace([self.fixture_file, self.fixture_subdir])
+
+    def test_isolation(self):
+        with self.scratch.directory() as first, self.scratch.directory() as second:
+            self.assertNotEqual(first, second)
+
+            for path in (first, second):
+                with open(os.path.join(path, 'data.txt')) as f:
+                    self.assertEqual('data', f.read())
+                with open(os.path.join(path, 'inputs', 'input.txt')) as f:
+                    self.assertEqual('input', f.read())
+
+            with open(os.path.join(first, 'data.txt'), 'w') as f:
+                f.write('changed')
+
+            with open(os.path.join(second, 'data.txt')) as f:
+                self.assertEqual('data', f.read())
+            with open(self.fixture_file) as f:
+                self.assertEqual('data', f.read())
+
+    def test_cleanup(self):
+        with self.scratch.directory() as path:
+            pass
+
+        self.scratch.close()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(self.scratch.root))
+
+    def tearDown(self) -> None:
+        self.scratch.close()
+        self.fixtures_dir.cleanup()
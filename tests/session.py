@@ -0,0 +1,171 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from tester.lang import Lang
+from tester.report import JUnitReporter
+from tester.scratch import ScratchSpace
+from tester.session import Session, Mode
+from tester.testmanip import Test
+
+
+class SessionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.src_path = 'tests/resources/src/inc/src.c'
+        self.tests_path = 'tests/resources/filled/inc_tests/small.txt'
+
+    def _grade(self, tests_path: str):
+        with Session(self.src_path, tests_path, jobs=2) as session:
+            self.assertTrue(session.parse().ok)
+            self.assertTrue(session.compile().ok)
+            return session.run()
+
+    def test_run(self):
+        result = self._grade(self.tests_path)
+
+        self.assertTrue(result.ok)
+        self.assertGreater(result.suitable, 0)
+        self.assertEqual(result.suitable, result.passed)
+        self.assertEqual(result.suitable, len(result.tests))
+        self.assertFalse(any(test.failed for test in result.tests))
+
+    def test_concurrent_sessions(self):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(self._grade, [self.tests_path] * 4))
+
+        for result in results:
+            self.assertEqual(result.suitable, result.passed)
+
+    def test_configuration_is_per_session(self):
+        with Session(self.src_path, encoding='utf-8', add_quotes=True) as session:
+            session.parse(StringIO('INPUT /{1}/ OUTPUT /{2 }/'))
+            self.assertEqual('utf-8', session.tests[0].text_encoding)
+            self.assertTrue(session.tests[0].quotes_framed_path)
+
+        self.assertEqual('ascii', Test.ENCODING)
+        self.assertFalse(Test.USE_QUOTES_FRAMED_PATH)
+
+    def test_fill(self):
+        with Session(self.src_path, mode=Mode.FILL) as session:
+            session.parse(StringIO('INPUT /{1}/ INPUT /{2 3}/'))
+            self.assertTrue(session.compile().ok)
+            result = session.run()
+
+            self.assertEqual(2, result.passed)
+            self.assertTrue(all(test.filled for test in session.tests))
+            self.assertIn('Filled tests: 2/2', session.report(result))
+
+    def test_timed_out_tests_are_not_filled(self):
+        with TemporaryDirectory() as scripts_dir:
+            program = os.path.join(scripts_dir, 'slow')
+            with open(program, 'w') as f:
+                f.write('#!/bin/sh\nsleep 5\n')
+            os.chmod(program, 0o755)
+
+            with Session(program, lang=Lang.Python, mode=Mode.FILL) as session:
+                session.parse(StringIO('TIMEOUT /{0.3}/ INPUT /{1}/'))
+                self.assertTrue(session.compile().ok)
+                result = session.run()
+
+                self.assertEqual(0, result.passed)
+                self.assertFalse(session.tests[0].filled)
+                self.assertTrue(session.tests[0].timed_out)
+
+    def test_report_finished_on_errors(self):
+        class BrokenReporter(JUnitReporter):
+            def report(self, test: Test) -> None:
+                raise RuntimeError('broken')
+
+        report_file = StringIO()
+        with Session(self.src_path, self.tests_path) as session:
+            session.parse()
+            session.compile()
+            with self.assertRaises(RuntimeError):
+                session.run(BrokenReporter(report_file))
+
+        self.assertTrue(report_file.getvalue().endswith('</testsuite>\n'))
+
+    def test_dedup_respects_time_limits(self):
+        tests = 'INPUT /{1}/ OUTPUT /{2 }/ INPUT /{1}/ OUTPUT /{2 }/ INPUT /{1}/ OUTPUT /{2 }/ REFTIME /{0.25}/'
+        with Session(self.src_path, dedup=True, timeout_factor=4) as session:
+            session.parse(StringIO(tests))
+            self.assertTrue(session.compile().ok)
+            result = session.run()
+
+        self.assertEqual(3, result.passed)
+        self.assertEqual(1, result.duplicates)
+
+    def test_apply_changes(self):
+        with Session(self.src_path, self.tests_path) as session:
+            self.assertTrue(session.apply_changes(set()))  # nothing was parsed yet
+
+            self.assertTrue(session.parse().ok)
+            self.assertTrue(session.compile().ok)
+            self.assertFalse(session.apply_changes(set()))
+            self.assertTrue(session.apply_changes({session.tests_path}))
+
+            self.assertFalse(session.apply_changes({session.source_path}))
+            self.assertFalse(session.run().ok)  # the build is forgotten until the next compile
+
+    def test_all_memchecks_complete(self):
+        with TemporaryDirectory() as scripts_dir:
+            valgrind = os.path.join(scripts_dir, 'valgrind')
+            with open(valgrind, 'w') as f:
+                f.write('#!/bin/sh\n'
+                        'for arg; do case $arg in --xml-file=*) xml=${arg#--xml-file=};; esac; done\n'
+                        'echo "<valgrindoutput><error><kind>Leak</kind><what>lost</what></error></valgrindoutput>"'
+                        ' > "$xml"\n')
+            os.chmod(valgrind, 0o755)
+
+            tests = ''.join('INPUT /{' + str(n) + '}/ OUTPUT /{' + str(n + 1) + ' }/ ' for n in range(10))
+            with mock.patch('tester.session.find_valgrind', return_value=valgrind), \
+                    Session(self.src_path, valgrind=True, valgrind_jobs=1) as session:
+                session.parse(StringIO(tests))
+                self.assertTrue(session.compile().ok)
+                result = session.run()
+
+        self.assertEqual(10, result.suitable)
+        self.assertEqual(0, result.passed)
+        self.assertEqual(0, result.unchecked)
+        self.assertTrue(all(test.memcheck_errors == ['Leak: lost'] for test in result.tests))
+
+    def test_scratch_space_removed_on_errors(self):
+        scratch_spaces = []
+
+        class RecordedScratchSpace(ScratchSpace):
+            def __init__(self, *args, **kwargs):
+                super(RecordedScratchSpace, self).__init__(*args, **kwargs)
+                scratch_spaces.append(self)
+
+        with TemporaryDirectory() as scripts_dir:
+            program = os.path.join(scripts_dir, 'utf')
+            with open(program, 'w') as f:
+                f.write('#!/bin/sh\nprintf "\\303\\251"\n')
+            os.chmod(program, 0o755)
+
+            with mock.patch('tester.session.ScratchSpace', RecordedScratchSpace), \
+                    Session(program, lang=Lang.Python, isolate=True) as session:
+                session.parse(StringIO('INPUT /{1}/ OUTPUT /{2}/'))
+                self.assertTrue(session.compile().ok)
+                with self.assertRaises(UnicodeDecodeError):
+                    session.run()
+
+        self.assertEqual(1, len(scratch_spaces))
+        self.assertFalse(os.path.exists(scratch_spaces[0].root))
+
+    def test_fixtures_refused_with_workers(self):
+        with Session(self.src_path, workers=['127.0.0.1:1']) as session:
+            session.parse(StringIO('FIXTURES /{data.txt}/ INPUT /{1}/ OUTPUT /{2 }/'))
+            self.assertTrue(session.compile().ok)
+            result = session.run()
+
+        self.assertFalse(result.ok)
+        self.assertIn('FIXTURES', result.error_message)
+
+    def test_not_compiled(self):
+        with Session(self.src_path) as session:
+            session.parse(StringIO('INPUT /{1}/ OUTPUT /{2 }/'))
+            self.assertFalse(session.run().ok)
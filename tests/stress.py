@@ -0,0 +1,58 @@
+import os
+import unittest
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+from tester.features import Tag
+from tester.stress import stress, write_mismatch
+from tester.testmanip import TestsParser
+
+
+class StressTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.scripts_dir = TemporaryDirectory()
+
+        self.generator = self._script('gen', 'echo "$1 "')
+        self.reference = self._script('ref', 'cat')
+        self.solution = self._script('sol', 'read x; if [ "$x" -lt 7 ]; then echo "$x"; else echo 0; fi')
+
+    def _script(self, name: str, body: str) -> str:
+        path = os.path.join(self.scripts_dir.name, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n' + body + '\n')
+        os.chmod(path, 0o755)
+        return path
+
+    def test_no_mismatch(self):
+        result = stress(self.generator, self.reference, self.reference, 20, jobs=4)
+
+        self.assertEqual(20, result.iterations)
+        self.assertIsNone(result.mismatch)
+        self.assertIsNone(result.error_message)
+
+    def test_mismatch(self):
+        result = stress(self.generator, self.reference, self.solution, 20, jobs=2, mods=['mTOKENS'])
+
+        self.assertEqual(7, result.seed)
+        self.assertEqual(b'7 \n', result.mismatch.get_feature(Tag.INPUT).merged_contents())
+        self.assertEqual(b'0\n', result.mismatch.prog_output)
+
+        output_path = os.path.join(self.scripts_dir.name, 'mismatch.txt')
+        write_mismatch(result.mismatch, output_path, timeout=3.5, epsilon=0.01, flags='-O2', output_limit=1000)
+        parser = TestsParser(binary=True)
+        with open(output_path) as f:
+            test, = parser.parse(StringIO(f.read()))
+        self.assertEqual(b'7 \n', test.get_feature(Tag.OUTPUT).merged_contents())
+        self.assertIn('mTOKENS', test.get_feature(Tag.OUTPUT).mods)
+
+        self.assertEqual(3.5, parser.get_timeout())
+        self.assertEqual(0.01, parser.get_epsilon())
+        self.assertEqual('-O2', parser.get_feature(Tag.FLAGS).merged_contents())
+        self.assertEqual(1000, parser.get_output_limit())
+
+    def test_generator_failure(self):
+        result = stress(self._script('bad', 'exit 1'), self.reference, self.reference, 5)
+        self.assertIsNotNone(result.error_message)
+
+    def tearDown(self) -> None:
+        self.scripts_dir.cleanup()
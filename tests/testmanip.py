@@ -1,11 +1,78 @@
+import shutil
 import unittest
+from io import StringIO
 from tempfile import TemporaryFile
+from unittest import mock
 
-from tester.testmanip import TestsParser
+from tester.features import Feature, Tag
+from tester.testmanip import TestsParser, Test, SectionReader
 
 
 class TestTest(unittest.TestCase):
-    pass  # TODO
+    def setUp(self) -> None:
+        self.test = Test('first')
+        self.test.add_feature(Feature(Tag.INPUT, ['1 2 3']))
+        self.test.add_feature(Feature(Tag.COMMENT, ['first comment']))
+
+        self.duplicate = Test('duplicate')
+        self.duplicate.add_feature(Feature(Tag.INPUT, ['1 2 3']))
+        self.duplicate.add_feature(Feature(Tag.COMMENT, ['second comment']))
+        self.duplicate.add_feature(Feature(Tag.OUTPUT, ['2 3 4']))
+
+    def test_execution_key(self):
+        self.assertEqual(self.test.execution_key(), self.duplicate.execution_key())
+
+        self.duplicate.add_feature(Feature(Tag.CMD, ['-v']))
+        self.assertNotEqual(self.test.execution_key(), self.duplicate.execution_key())
+
+    def test_changes_environment(self):
+        self.assertFalse(self.test.changes_environment())
+        self.test.add_feature(Feature(Tag.CLEANUP, ['rm -f out.txt']))
+        self.assertTrue(self.test.changes_environment())
+
+    def test_output_limit(self):
+        test = Test('flood')
+        test.add_feature(Feature(Tag.OUTPUT, ['y\n']))
+
+        self.assertFalse(test.run(shutil.which('yes'), 10.0, output_limit=1 << 16))
+        self.assertTrue(test.output_limit_exceeded)
+        self.assertIn('Output limit exceeded', test.last_run_details())
+
+    def test_time_limit(self):
+        test = Test('slow')
+        test.add_feature(Feature(Tag.CMD, ['5']))
+        test.add_feature(Feature(Tag.OUTPUT, ['Time limit exceeded']))
+
+        self.assertFalse(test.run(shutil.which('sleep'), 0.3))
+        self.assertTrue(test.timed_out)
+
+    def test_reuse_run(self):
+        self.test.prog_output = '2 3 4'
+        self.assertTrue(self.duplicate.reuse_run(self.test))
+
+        self.test.prog_output = '2 3 5'
+        self.assertFalse(self.duplicate.reuse_run(self.test))
+        self.assertEqual('2 3 5', self.duplicate.prog_output)
+
+    def test_adaptive_timeout(self):
+        self.test.prog_output = '2 3 4'
+        self.test.elapsed = 0.25
+        self.test.fill()
+
+        self.assertEqual(0.25, self.test.reference_time())
+        self.assertEqual(2.0, self.test.adaptive_timeout(2.0))
+        self.assertEqual(1.0, self.test.adaptive_timeout(2.0, factor=4))
+        self.assertEqual(2.0, self.test.adaptive_timeout(2.0, factor=4, calibration=2))
+        self.assertEqual(1.5, self.test.adaptive_timeout(2.0, factor=4, floor=1.5, calibration=0.5))
+
+        self.assertIsNone(self.duplicate.reference_time())
+
+        self.duplicate.prog_output = 'Time limit exceeded'
+        self.duplicate.elapsed = 2.0
+        self.duplicate.timed_out = True
+        self.duplicate.fill()
+        self.assertIsNone(self.duplicate.reference_time())
+        self.assertEqual(2.0, self.duplicate.adaptive_timeout(2.0, factor=4))
 
 
 class TestsParserTest(unittest.TestCase):
@@ -30,5 +97,54 @@ class TestsParserTest(unittest.TestCase):
         parser.delete_sanitizers()
         self.assertEqual([], parser.get_sanitizers())
 
+    def test_iter_parse(self):
+        parser = TestsParser()
+        tests = parser.iter_parse(self.tests_file)
+
+        next(tests)
+        self.assertEqual('1 2 3 -fsanitize=smth', parser.get_flags())
+        self.assertEqual(1, parser.parse_details['ntests'])
+
+        self.assertEqual(1, len(list(tests)))
+        self.assertEqual(2, parser.parse_details['ntests'])
+        self.assertIsNone(parser.parse_details['error_message'])
+
+    def test_chunked_reading(self):
+        with mock.patch.object(SectionReader, 'CHUNK_SIZE', 2):
+            parser = TestsParser()
+            tests = parser.parse(self.tests_file)
+
+        self.assertEqual(2, len(tests))
+        self.assertEqual('1 2 3 -fsanitize=smth', parser.get_flags())
+        self.assertEqual('inp2', tests[1].get_feature(Tag.INPUT).merged_contents())
+        self.assertEqual('outp2', tests[1].get_feature(Tag.OUTPUT).merged_contents())
+
+    def test_unmatched_brackets(self):
+        for text in ('INPUT /{1 2', 'INPUT /{1}/ OUTPUT /{2', 'INPUT /{1}/ }/ OUTPUT /{2}/', 'INPUT /{1 /{ 2}/'):
+            parser = TestsParser()
+            self.assertIsNone(parser.parse(StringIO(text)))
+            self.assertIsNotNone(parser.parse_details['error_message'])
+
+    def test_binary_mode(self):
+        output = '\u0448'.encode('utf-8')
+        text = (b'INPUT /{\xff\r\n}/ OUTPUT /{' + output + b'}/').decode('latin-1')
+        parser = TestsParser(binary=True)
+        test, = parser.parse(StringIO(text))
+
+        self.assertEqual(b'\xff\r\n', test.get_feature(Tag.INPUT).merged_contents())
+        self.assertEqual(output, test.get_feature(Tag.OUTPUT).merged_contents())
+        self.assertIsNone(test.encoding())
+        self.assertIn('/{\xff\r\n}/', str(test))
+
+        test.prog_output = output
+        self.assertTrue(test.judge())
+
+    def test_binary_mode_without_input(self):
+        test, = TestsParser(binary=True).parse(StringIO('CMD /{hello}/ OUTPUT /{hello\n}/'))
+        self.assertEqual(b'', test.get_feature(Tag.INPUT).merged_contents())
+
+        self.assertTrue(test.run(shutil.which('echo'), 5.0, output_limit=1000))
+        self.assertEqual(b'hello\n', test.prog_output)
+
     def tearDown(self) -> None:
         self.tests_file.close()
@@ -0,0 +1,58 @@
+import os
+import sys
+import threading
+import unittest
+from tempfile import TemporaryDirectory
+from typing import Set
+from unittest import mock
+
+from tester.watch import Watcher
+
+
+class WatcherTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = TemporaryDirectory()
+        self.source = self._write('src.c', 'int main() {}')
+        self.tests = self._write('tests.txt', 'INPUT /{1}/')
+
+    def _write(self, name: str, contents: str) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            f.write(contents)
+        return path
+
+    def _wait(self, watcher: Watcher) -> Set[str]:
+        """Watcher.wait that fails the test instead of blocking forever"""
+        changed = []
+        waiter = threading.Thread(target=lambda: changed.append(watcher.wait()), daemon=True)
+        waiter.start()
+        waiter.join(5.0)
+        self.assertEqual(1, len(changed), 'no changes were noticed')
+        return changed[0]
+
+    def _check_changes(self, watcher: Watcher) -> None:
+        try:
+            # saved before wait is called, e.g. while tests were running
+            self._write('tests.txt', 'INPUT /{1}/ OUTPUT /{2}/')
+            self.assertEqual({self.tests}, self._wait(watcher))
+
+            self._write('src.c', 'int main() { return 0; }')
+            self.assertEqual({self.source}, self._wait(watcher))
+        finally:
+            watcher.close()
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'requires inotify')
+    def test_inotify(self):
+        watcher = Watcher([self.source, self.tests])
+        self.assertIsNotNone(watcher._inotify_fd)
+        self._check_changes(watcher)
+
+    def test_polling(self):
+        with mock.patch.object(Watcher, '_init_inotify', return_value=None), \
+                mock.patch.object(Watcher, 'POLL_INTERVAL', 0.01):
+            watcher = Watcher([self.source, self.tests])
+            self.assertIsNone(watcher._inotify_fd)
+            self._check_changes(watcher)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()